@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    # фоновые потоки превью пишут в MEDIA_ROOT, который тесты удаляют
+    # сразу после себя: в тестах превью строятся в том же потоке
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,41 @@
+import os
+import pickle
+import time
+import zlib
+
+from django.core.cache.backends import filebased
+from django.core.files import locks
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Файловый кэш, который можно делить между воркерами.
+
+    incr у FileBasedCache из Django — get и set без блокировки: два
+    процесса получают одно значение, и два сброса поколения ленты
+    сливаются в один. К тому же set переписывает ключ с таймаутом по
+    умолчанию. Здесь incr выполняется под блокировкой файла и сохраняет
+    срок жизни ключа.
+    """
+    lock_name = 'incr.lock'
+
+    def incr(self, key, delta=1, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        with open(os.path.join(self._dir, self.lock_name), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                try:
+                    with open(fname, 'rb') as f:
+                        expiry = pickle.load(f)
+                        value = pickle.loads(zlib.decompress(f.read()))
+                except (FileNotFoundError, EOFError):
+                    expiry, value = 0, None
+                if value is None or (
+                        expiry is not None and expiry < time.time()):
+                    raise ValueError(f"Key '{key}' not found")
+                value += delta
+                timeout = None if expiry is None else expiry - time.time()
+                self.set(key, value, timeout, version)
+            finally:
+                locks.unlock(lock)
+        return value
@@ -0,0 +1,54 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.ico', '.map',
+)
+
+
+def compressors():
+    yield '.gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хэшированные имена статики и сжатые копии рядом с ними.
+
+    collectstatic кладёт рядом с app.3f2a1b.css файлы app.3f2a1b.css.gz
+    и (если установлен brotli) app.3f2a1b.css.br; core.views.serve
+    отдаёт их клиентам, которые принимают такое сжатие.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = []
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if isinstance(hashed_name, str) and hashed_name.endswith(
+                    COMPRESSIBLE):
+                hashed.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in dict.fromkeys(hashed):
+            yield from self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compress in compressors():
+            compressed = compress(data)
+            # сжатая копия, которая не меньше оригинала, не нужна
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
+            yield name, name + extension, True
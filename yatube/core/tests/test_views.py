@@ -0,0 +1,137 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.http import http_date
+
+from core.views import serve
+
+TEMP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+HASHED = 'posts/ab/cd/' + 'ab' * 32 + '.jpg'
+
+
+class ServeTest(SimpleTestCase):
+    """Раздача медиа: условные запросы, диапазоны и сжатые копии."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_ROOT, 'posts/ab/cd'))
+        for name in (HASHED, 'posts/legacy.jpg'):
+            with open(os.path.join(TEMP_ROOT, name), 'wb') as file:
+                file.write(CONTENT)
+        with open(os.path.join(TEMP_ROOT, 'app.css'), 'wb') as file:
+            file.write(b'body { color: red; }' * 50)
+        with open(os.path.join(TEMP_ROOT, 'app.css.gz'), 'wb') as file:
+            file.write(gzip.compress(b'body { color: red; }' * 50))
+        cls.factory = RequestFactory()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def get(self, path, **headers):
+        return serve(self.factory.get('/media/' + path, **headers),
+                     path, TEMP_ROOT)
+
+    def test_full_response_headers(self):
+        response = self.get(HASHED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('must-revalidate',
+                      self.get('posts/legacy.jpg')['Cache-Control'])
+
+    def test_conditional_requests(self):
+        response = self.get(HASHED)
+        self.assertEqual(
+            self.get(HASHED, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304)
+        self.assertEqual(
+            self.get(HASHED, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            .status_code,
+            304)
+        self.assertEqual(
+            self.get(HASHED, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_range_requests(self):
+        response = self.get(HASHED, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+
+        response = self.get(HASHED, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+        response = self.get(HASHED, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        etag = self.get(HASHED)['ETag']
+        self.assertEqual(
+            self.get(HASHED, HTTP_RANGE='bytes=0-9',
+                     HTTP_IF_RANGE=etag).status_code,
+            206)
+        self.assertEqual(
+            self.get(HASHED, HTTP_RANGE='bytes=0-9',
+                     HTTP_IF_RANGE='"stale"').status_code,
+            200)
+        self.assertEqual(
+            self.get(HASHED, HTTP_RANGE='bytes=0-9',
+                     HTTP_IF_RANGE=http_date(0)).status_code,
+            200)
+
+    def test_precompressed_variant(self):
+        response = self.get('app.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b'body { color: red; }' * 50)
+        response = self.get('app.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_outside_root(self):
+        with self.assertRaises(Http404):
+            self.get('../settings.py')
+        with self.assertRaises(Http404):
+            self.get('posts/missing.jpg')
+
+
+class CompressedManifestStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        with open(os.path.join(self.source, 'site.css'), 'w') as file:
+            file.write('body { margin: 0; }\n' * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.source, ignore_errors=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with self.settings(
+            STATICFILES_DIRS=[self.source],
+            STATIC_ROOT=self.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        names = os.listdir(self.root)
+        hashed = [name for name in names
+                  if name.startswith('site.') and name.endswith('.css')
+                  and name != 'site.css']
+        self.assertEqual(len(hashed), 1)
+        self.assertIn(hashed[0] + '.gz', names)
+        self.assertIn('staticfiles.json', names)
@@ -1,5 +1,25 @@
 # core/views.py
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+# имя с хэшем содержимого: posts/ab/cd/<sha256>.jpg или app.3f2a1b9c0d4e.css
+HASHED_NAME = re.compile(r'([0-9a-f]{64}|\.[0-9a-f]{12})\.[^/.]+$')
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# от предпочтительного сжатия к запасному
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+CHUNK_SIZE = 64 * 1024
 
 
 def page_not_found(request, exception):
@@ -12,3 +32,134 @@ def csrf_failure(request, reason=''):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def accepts_encoding(request, encoding):
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip() == encoding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0')
+    return False
+
+
+def parse_range(header, size):
+    """(начало, конец) диапазона; None — отдать файл целиком,
+    False — диапазон за пределами файла."""
+    match = BYTE_RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500: последние 500 байт
+        if int(end) == 0:
+            return False
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if start >= size:
+        return False
+    end = min(int(end), size - 1) if end else size - 1
+    if end < start:
+        return None
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def compressed_variants(path):
+    return [
+        (encoding, path + extension) for encoding, extension in ENCODINGS
+        if os.path.isfile(path + extension)
+    ]
+
+
+def pick_variant(request, variants, path, encoding):
+    """Сжатая копия, которую принимает клиент, иначе сам файл."""
+    for name, variant in variants:
+        if accepts_encoding(request, name):
+            return variant, name
+    return path, encoding
+
+
+def serve(request, path, document_root, immutable=None):
+    """Раздача статики и медиа без веб-сервера перед Django.
+
+    Поддерживает ETag/Last-Modified (304), Range (206/416) и заранее
+    сжатые копии .br/.gz. Файлы с хэшем в имени кэшируются навсегда
+    (immutable=None — решить по имени).
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+    content_type, file_encoding = mimetypes.guess_type(fullpath)
+    byte_range = request.META.get('HTTP_RANGE')
+    variants = [] if file_encoding else compressed_variants(fullpath)
+    served, encoding = fullpath, file_encoding
+    if not byte_range:
+        served, encoding = pick_variant(request, variants, served, encoding)
+    stat = os.stat(served)
+    last_modified = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if immutable is None:
+        immutable = HASHED_NAME.search(path) is not None
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(
+            request, served, stat.st_size, byte_range,
+            etag, last_modified, content_type)
+        if encoding and response.status_code == 200:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    if variants:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _file_response(request, path, size, byte_range, etag, last_modified,
+                   content_type):
+    content_type = content_type or 'application/octet-stream'
+    bounds = None
+    if byte_range and if_range_matches(request, etag, last_modified):
+        bounds = parse_range(byte_range, size)
+    if bounds is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if bounds is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = bounds
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
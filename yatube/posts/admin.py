@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
 
 from .models import Group, Post, Comment
+from .search import backend, terms
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +18,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # вместо LIKE '%...%' по всей таблице — поисковый индекс
+        query_terms = terms(search_term)
+        if not query_terms:
+            return queryset, False
+        pks = backend().search(
+            query_terms, 0, settings.POSTS_SEARCH_MAX_RESULTS)
+        return queryset.filter(pk__in=pks), False
+
 
 # класс PostAdmin
 admin.site.register(Post, PostAdmin)
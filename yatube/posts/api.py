@@ -0,0 +1,170 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from .models import Follow, Group, Post, User
+from .timeline import FollowFeed
+from .utils import COMMENT_ORDERING, KEYSET_ORDERING, KeysetPaginator
+
+# поле ответа -> выражение для .values(); клиент выбирает нужные
+# через ?fields=, остальные колонки не читаются из базы
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+FOLLOW_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+}
+
+
+def image_url(name):
+    return Post.image.field.storage.url(name) if name else None
+
+
+CONVERTERS = {
+    'image': image_url,
+}
+
+
+def requested_fields(request, fields):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def page_limit(request):
+    limit = request.GET.get('limit')
+    if limit is None:
+        return settings.POSTS_LIMIT
+    if not limit.isdigit() or not 0 < int(limit) <= settings.API_MAX_LIMIT:
+        raise ValueError(f'limit — число от 1 до {settings.API_MAX_LIMIT}')
+    return int(limit)
+
+
+def serialize(row, names, fields):
+    return {
+        name: CONVERTERS.get(name, lambda value: value)(row[fields[name]])
+        for name in names
+    }
+
+
+def api_page(request, queryset, fields, ordering=KEYSET_ORDERING,
+             source=None):
+    """Страница ответа API: .values() без моделей, курсор по ordering.
+
+    source — обёртка над .values() со своим seek (лента подписок).
+    """
+    try:
+        names = requested_fields(request, fields)
+        limit = page_limit(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    keys = [order.lstrip('-') for order in ordering]
+    rows = queryset.values(
+        *dict.fromkeys([*(fields[name] for name in names), *keys]))
+    if source is not None:
+        rows = source(rows)
+    page = KeysetPaginator(rows, limit, ordering).get_page(
+        request.GET.get('cursor'))
+    return JsonResponse(
+        {
+            'results': [serialize(row, names, fields) for row in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        },
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+class FollowRows:
+    """Лента подписок для KeysetPaginator строками .values().
+
+    Порядок берётся из FollowFeed.seek_keys, строки постов страницы
+    дочитываются одним запросом по id.
+    """
+    model = Post
+
+    def __init__(self, user, rows):
+        self.feed = FollowFeed(user)
+        self.rows = rows
+
+    def seek(self, key, forward, limit):
+        pks = [pk for _, pk in self.feed.seek_keys(key, forward, limit)]
+        rows = {row['id']: row for row in self.rows.filter(id__in=pks)}
+        return [rows[pk] for pk in pks if pk in rows]
+
+
+def login_required_json(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Нужна авторизация'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def posts(request):
+    return api_page(request, Post.objects.all(), POST_FIELDS)
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return api_page(request, group.posts.all(), POST_FIELDS)
+
+
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return api_page(request, author.posts.all(), POST_FIELDS)
+
+
+@login_required_json
+def follow_posts(request):
+    return api_page(
+        request, Post.objects.all(), POST_FIELDS,
+        source=lambda rows: FollowRows(request.user, rows),
+    )
+
+
+def groups(request):
+    return api_page(request, Group.objects.all(), GROUP_FIELDS, ('id',))
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    return api_page(
+        request, post.comments.all(), COMMENT_FIELDS, COMMENT_ORDERING,
+    )
+
+
+@login_required_json
+def follows(request):
+    return api_page(
+        request, Follow.objects.filter(user=request.user), FOLLOW_FIELDS,
+        ('-id',),
+    )
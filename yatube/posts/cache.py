@@ -0,0 +1,140 @@
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Post
+
+
+def generation_key(feed):
+    return f'posts:generation:{feed}'
+
+
+def _initial_generation():
+    # после вытеснения ключа поколение не должно вернуться к старому
+    # значению, иначе всплывут фрагменты, закэшированные до сброса
+    return int(time.time() * 1000)
+
+
+def get_generation(feed):
+    """Текущее поколение ленты: index, group:<id> или author:<id>."""
+    key = generation_key(feed)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def changed_key(feed):
+    return f'posts:changed:{feed}'
+
+
+def bump_generation(*feeds):
+    """Сбрасывает все закэшированные страницы перечисленных лент."""
+    feeds = set(feeds)
+    for feed in feeds:
+        key = generation_key(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    now = time.time()
+    cache.set_many({changed_key(feed): now for feed in feeds}, None)
+
+
+def feed_state(feed):
+    """Поколение ленты и время её последнего изменения (для Last-Modified)."""
+    generation = get_generation(feed)
+    key = changed_key(feed)
+    changed = cache.get(key)
+    if changed is None:
+        # время вытеснено: считаем, что лента изменилась только что
+        cache.add(key, time.time(), None)
+        changed = cache.get(key)
+    return generation, changed
+
+
+def feed_cache_context(feed, page_obj):
+    """Ключ фрагмента ленты для {% cache %}: лента, поколение, страница.
+
+    feed_changed — время последнего изменения ленты, от него страница
+    спрашивает о новых постах (?since=).
+    """
+    generation, changed = feed_state(feed)
+    if getattr(page_obj.paginator, 'keyset', False):
+        # курсорная страница уже прочитана, ключом служит её состав;
+        # id берутся из строк страницы, чтобы не собирать сами посты
+        ids = getattr(page_obj, 'row_ids', None)
+        if ids is None:
+            ids = [post.pk for post in page_obj]
+        page = 'ids-' + '-'.join(map(str, ids))
+    else:
+        page = page_obj.number
+    return {
+        'feed_cache_key': f'{feed}:{generation}:{page}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_changed': datetime.fromtimestamp(
+            changed, timezone.utc).isoformat(),
+    }
+
+
+HYDRATE_STATS_KEYS = {
+    'hits': 'posts:hydrate:hits',
+    'misses': 'posts:hydrate:misses',
+}
+# те же счётчики в пределах текущего процесса
+local_hydration_stats = Counter()
+
+
+def post_cache_key(pk):
+    return f'posts:post:{pk}'
+
+
+def invalidate_posts(*pks):
+    cache.delete_many([post_cache_key(pk) for pk in pks])
+
+
+def _count_hydration(**counts):
+    local_hydration_stats.update(counts)
+    for name, value in counts.items():
+        if not value:
+            continue
+        key = HYDRATE_STATS_KEYS[name]
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, None)
+
+
+def hydration_stats():
+    """Счётчики попаданий и промахов hydrate_posts для метрик."""
+    values = cache.get_many(HYDRATE_STATS_KEYS.values())
+    return {
+        name: values.get(key, 0) for name, key in HYDRATE_STATS_KEYS.items()
+    }
+
+
+def hydrate_posts(pks):
+    """Посты по списку id в том же порядке.
+
+    Один cache.get_many на всю страницу, промахи — одним in_bulk
+    с автором и группой, и обратно в кэш одним set_many.
+    """
+    keys = {post_cache_key(pk): pk for pk in pks}
+    cached = cache.get_many(keys.keys())
+    posts = {keys[key]: post for key, post in cached.items()}
+    missing = [pk for pk in pks if pk not in posts]
+    if missing:
+        loaded = Post.objects.select_related(
+            'author', 'group').in_bulk(missing)
+        cache.set_many(
+            {post_cache_key(pk): post for pk, post in loaded.items()},
+            settings.POST_CACHE_TIMEOUT,
+        )
+        posts.update(loaded)
+    _count_hydration(hits=len(cached), misses=len(missing))
+    return [posts[pk] for pk in pks if pk in posts]
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache import feed_state
+from .models import Comment, Follow, Group, Post, User
+
+
+def _viewer(request):
+    # шапка страницы и кнопки зависят от того, кто смотрит
+    user = request.user
+    if user.is_authenticated:
+        return user.pk, user.get_username()
+    return (None,)
+
+
+def conditional(validators):
+    """@condition с ETag и Last-Modified из одной функции validators.
+
+    validators(request, *args, **kwargs) возвращает (части ETag, время
+    изменения) или None, если объекта нет, — тогда отвечает сама view.
+    Считается один раз на запрос и без рендера шаблона.
+    """
+    def computed(request, *args, **kwargs):
+        if not hasattr(request, '_validators'):
+            request._validators = validators(request, *args, **kwargs)
+        return request._validators
+
+    def etag(request, *args, **kwargs):
+        result = computed(request, *args, **kwargs)
+        if result is None:
+            return None
+        parts = (*result[0], *_viewer(request))
+        return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        result = computed(request, *args, **kwargs)
+        return None if result is None else result[1]
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # страница своя у каждого пользователя и всегда сверяется
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+
+    return decorator
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+def feed_validators(feed):
+    generation, changed = feed_state(feed)
+    return (feed, generation), _timestamp(changed)
+
+
+def index_validators(request):
+    return feed_validators('index')
+
+
+def group_validators(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return None
+    return feed_validators(f'group:{group_id}')
+
+
+def profile_validators(request, username):
+    author = User.objects.filter(username=username).values_list(
+        'id',
+        'stats__posts_count',
+        'stats__followers_count',
+        'stats__following_count',
+    ).first()
+    if author is None:
+        return None
+    parts, changed = feed_validators(f'author:{author[0]}')
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author_id=author[0]).exists()
+    return (*parts, *author[1:], following), changed
+
+
+def post_validators(request, post_id):
+    # последний комментарий берётся по индексу (post, created, id)
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')).order_by('-created').values('created')[:1]
+    post = Post.objects.filter(pk=post_id).annotate(
+        last_comment=Subquery(last_comment),
+    ).order_by().values_list(
+        'updated', 'comments_count', 'author__stats__posts_count',
+        'last_comment',
+    ).first()
+    if post is None:
+        return None
+    updated, comments_count, posts_count, last_comment = post
+    changed = max(filter(None, (updated, last_comment)))
+    return (
+        (post_id, changed.timestamp(), comments_count, posts_count),
+        changed,
+    )
@@ -0,0 +1,74 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def change_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя: posts_count=1 и т.п.
+
+    Строка создаётся вместе с пользователем; если её нет (например,
+    после loaddata), счётчики восстановит reconcile_counters.
+    """
+    UserStats.objects.filter(
+        user_id=user_id,
+        # не уводим счётчик ниже нуля, если он уже разошёлся с базой
+        **{f'{name}__gte': -delta for name, delta in deltas.items()
+           if delta < 0},
+    ).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(
+        pk=post_id, comments_count__gte=max(-delta, 0)
+    ).update(comments_count=F('comments_count') + delta)
+
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _real_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def _fix(queryset, counters):
+    """Обновляет строки, где счётчики разошлись с COUNT(*)."""
+    real = {
+        name: _real_count(model, field)
+        for name, (model, field) in counters.items()
+    }
+    stale = list(
+        queryset.annotate(
+            **{f'real_{name}': value for name, value in real.items()}
+        ).exclude(
+            **{name: F(f'real_{name}') for name in counters}
+        ).values_list('pk', flat=True)
+    )
+    queryset.filter(pk__in=stale).update(**real)
+    return len(stale)
+
+
+def reconcile():
+    """Пересчитывает все счётчики; возвращает число исправленных строк."""
+    missing = list(User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True))
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing],
+        ignore_conflicts=True,
+    )
+    return {
+        'users': len(missing) + _fix(UserStats.objects.all(), USER_COUNTERS),
+        'posts': _fix(
+            Post.objects.all(), {'comments_count': (Comment, 'post')}),
+    }
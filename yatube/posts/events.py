@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+
+class Subscription:
+    """Очередь событий одного клиента потока (posts.stream)."""
+
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(settings.STREAM_QUEUE_SIZE)
+        self.dropped = 0
+
+    def put(self, event):
+        # вызывается в цикле событий клиента; медленный клиент теряет
+        # события, а не копит их в памяти процесса
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Шина событий внутри процесса: канал -> подписки.
+
+    publish можно звать из любого потока (сигналы срабатывают в потоках
+    WSGI-приложения), события доставляются в цикл asyncio подписчика.
+    Другие процессы событий этой шины не видят.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[channel]
+
+    def listened(self, channels):
+        """Есть ли у каналов подписчики: без них событие не собирается."""
+        with self._lock:
+            return any(channel in self._subscriptions for channel in channels)
+
+    def publish(self, channels, event):
+        with self._lock:
+            targets = set().union(
+                *(self._subscriptions.get(channel, ()) for channel in channels)
+            )
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.put, event)
+            except RuntimeError:
+                # цикл клиента уже закрыт, подписка уйдёт при отключении
+                pass
+
+
+bus = EventBus()
+
+
+def post_channels(post):
+    channels = ['index', f'author:{post.author_id}']
+    if post.group_id:
+        channels.append(f'group:{post.group_id}')
+    return channels
+
+
+def encode(kind, data):
+    return {
+        'event': kind,
+        'id': f'{kind}-{data["id"]}',
+        'data': json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False),
+    }
+
+
+def publish_post(post):
+    channels = post_channels(post)
+    if not bus.listened(channels):
+        return
+    event = encode('post', {
+        'id': post.id,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'text': post.text,
+        'pub_date': post.pub_date,
+    })
+    transaction.on_commit(lambda: bus.publish(channels, event))
+
+
+def publish_comment(comment):
+    channels = post_channels(comment.post)
+    if not bus.listened(channels):
+        return
+    event = encode('comment', {
+        'id': comment.id,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    })
+    transaction.on_commit(lambda: bus.publish(channels, event))
@@ -0,0 +1,81 @@
+from django.db import connection, transaction
+from django.http import Http404
+
+from . import timeline
+from .counters import change_user_stats
+from .models import Follow, User
+from .utils import feed_count_key, invalidate_feed_counts
+
+
+def followed(user_id, author_id):
+    """Счётчики и лента подписок после появления подписки."""
+    change_user_stats(author_id, followers_count=1)
+    change_user_stats(user_id, following_count=1)
+    timeline.update_mode(author_id)
+    timeline.backfill(user_id, author_id)
+    invalidate_feed_counts(feed_count_key('follow', user_id))
+
+
+def unfollowed(user_id, author_id):
+    """Счётчики и лента подписок после удаления подписки."""
+    change_user_stats(author_id, followers_count=-1)
+    change_user_stats(user_id, following_count=-1)
+    timeline.trim(user_id, author_id)
+    invalidate_feed_counts(feed_count_key('follow', user_id))
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return quote(Follow._meta.db_table), quote(User._meta.db_table)
+
+
+def _missing(username):
+    # вызывается только когда запрос ничего не изменил
+    if not User.objects.filter(username=username).exists():
+        raise Http404(f'Нет пользователя {username}')
+
+
+def follow(user_id, username):
+    """Подписка одним INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+
+    Повторная подписка и подписка на себя ничего не делают; счётчики
+    и лента меняются в той же транзакции, только если строка вставлена.
+    Возвращает True, если подписка появилась.
+    """
+    follow_table, user_table = _tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {follow_table} (user_id, author_id) '
+            f'SELECT %s, id FROM {user_table} '
+            f'WHERE username = %s AND id <> %s '
+            f'ON CONFLICT DO NOTHING RETURNING author_id',
+            [user_id, username, user_id],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            _missing(username)
+            return False
+        followed(user_id, row[0])
+    return True
+
+
+def unfollow(user_id, username):
+    """Отписка одним DELETE по (user_id, username); повтор ничего не делает.
+
+    Возвращает True, если подписка была удалена.
+    """
+    follow_table, user_table = _tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {follow_table} '
+            f'WHERE user_id = %s AND author_id = '
+            f'(SELECT id FROM {user_table} WHERE username = %s) '
+            f'RETURNING author_id',
+            [user_id, username],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            _missing(username)
+            return False
+        unfollowed(user_id, row[0])
+    return True
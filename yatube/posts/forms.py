@@ -1,5 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from .images import normalize_image
 from .models import Comment, Post
 
 
@@ -8,6 +12,17 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # при редактировании без новой загрузки здесь уже сохранённый файл
+        if not isinstance(image, UploadedFile):
+            return image
+        limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        if image.size > limit:
+            raise forms.ValidationError(
+                f'Картинка больше {filesizeformat(limit)}')
+        return normalize_image(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,121 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_with_thumbnails
+
+from .models import Post
+from .thumbnails import source_file
+
+logger = logging.getLogger(__name__)
+
+# форматы, которые сохраняются как есть; остальные становятся JPEG/PNG
+KEPT_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+# анимация, которую перекодирование испортило бы; многокадровый MPO
+# с телефонных камер — это JPEG с дополнительными снимками, он
+# нормализуется по первому кадру
+ANIMATED_FORMATS = {'GIF', 'PNG', 'WEBP'}
+
+
+def _output_format(image):
+    if image.format in KEPT_FORMATS:
+        return image.format
+    return 'PNG' if 'A' in image.getbands() else 'JPEG'
+
+
+def normalize_image(upload):
+    """Уменьшает загруженную картинку, убирает EXIF и перекодирует её.
+
+    Анимированные GIF, PNG и WebP сохраняются без изменений.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format in ANIMATED_FORMATS and getattr(
+            image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    limit = settings.POST_IMAGE_MAX_DIMENSION
+    format_ = _output_format(image)
+    if image.format in ('JPEG', 'MPO'):
+        # JPEG можно декодировать сразу в уменьшенном масштабе
+        image.draft(image.mode, (limit, limit))
+    # поворот из EXIF применяется до того, как EXIF будет отброшен
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    # exif_transpose оставляет EXIF в info, а PNG записывает его оттуда
+    image.info.pop('exif', None)
+    params = {'optimize': True, 'exif': b''}
+    if image.info.get('icc_profile'):
+        params['icc_profile'] = image.info['icc_profile']
+    if format_ == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        params.update(
+            quality=settings.POST_IMAGE_JPEG_QUALITY, progressive=True)
+    elif format_ == 'WEBP':
+        params['quality'] = settings.POST_IMAGE_JPEG_QUALITY
+    content = BytesIO()
+    image.save(content, format_, **params)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(content.getvalue(), name + KEPT_FORMATS[format_])
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def keep_upload(post):
+    """Запоминает содержимое новой картинки до сохранения поста.
+
+    Если файл с тем же содержимым уже есть, хранилище его не пишет, а
+    параллельный release_image может удалить его до коммита поста;
+    по запомненному содержимому restore_upload запишет файл заново.
+    """
+    if post.image and not post.image._committed:
+        post._image_upload = post.image.file
+
+
+def restore_upload(post):
+    content = post.__dict__.pop('_image_upload', None)
+    if content is None:
+        return
+    name = post.image.name
+
+    def restore():
+        try:
+            _storage().ensure(name, content)
+        except Exception:
+            logger.exception('Не удалось записать картинку %s', name)
+
+    transaction.on_commit(restore)
+
+
+def release_image(name):
+    """Удаляет файл картинки с превью, если на него не ссылаются посты.
+
+    Одинаковые картинки хранятся одним файлом (ContentAddressedStorage),
+    поэтому счётчиком ссылок служат сами посты. Файл сначала убирается
+    под временное имя и только потом ссылки проверяются ещё раз: пост,
+    закоммиченный раньше, вернёт файл, а позже — запишет его заново.
+    """
+    def release():
+        if Post.objects.filter(image=name).exists():
+            return
+        storage = _storage()
+        try:
+            retired = storage.retire(name)
+            if retired is None:
+                return
+            if Post.objects.filter(image=name).exists():
+                storage.restore(retired, name)
+                return
+            storage.delete(retired)
+            delete_with_thumbnails(source_file(name), delete_file=False)
+        except Exception:
+            logger.exception('Не удалось удалить картинку %s', name)
+
+    transaction.on_commit(release)
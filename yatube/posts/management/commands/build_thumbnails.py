@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import ready_thumbnails, render_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие превью картинок постов, например для '
+        'загруженных до появления фоновой генерации.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить превью даже там, где они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        built = 0
+        for name in names.iterator():
+            ready = ready_thumbnails([name])[name]
+            if options['all'] or None in ready.values():
+                render_thumbnails(name)
+                built += 1
+        self.stdout.write(f'Построено превью: {built}')
@@ -0,0 +1,74 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.cache import hydrate_posts, local_hydration_stats
+from posts.models import Post
+
+
+def run_worker(ids, pages, per_page, seed):
+    # соединения родителя после fork использовать нельзя
+    connections.close_all()
+    local_hydration_stats.clear()
+    rnd = random.Random(seed)
+    started = time.monotonic()
+    for _ in range(pages):
+        start = rnd.randrange(0, max(len(ids) - per_page, 1))
+        hydrate_posts(ids[start:start + per_page])
+    return (
+        local_hydration_stats['hits'],
+        local_hydration_stats['misses'],
+        time.monotonic() - started,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Доля попаданий кэша постов при чтении лент из нескольких '
+        'процессов: сравнивает YATUBE_CACHE_BACKEND=locmem и общие бэкенды.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--pages', type=int, default=200,
+                            help='Сколько страниц читает каждый воркер.')
+        parser.add_argument('--posts', type=int, default=500,
+                            help='Сколько последних постов участвуют.')
+
+    def handle(self, *args, **options):
+        ids = list(Post.objects.values_list('id', flat=True)[
+            :options['posts']])
+        if not ids:
+            self.stderr.write('Нет постов для чтения.')
+            return
+        cache.clear()
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['workers']) as pool:
+            results = pool.starmap(
+                run_worker,
+                [
+                    (ids, options['pages'], settings.POSTS_LIMIT, seed)
+                    for seed in range(options['workers'])
+                ],
+            )
+        self.stdout.write(
+            f'Бэкенд: {settings.CACHES["default"]["BACKEND"]}, '
+            f'постов: {len(ids)}'
+        )
+        for number, (hits, misses, elapsed) in enumerate(results, 1):
+            self.stdout.write(
+                f'воркер {number}: попаданий {hits}, промахов {misses}, '
+                f'{hits / ((hits + misses) or 1):.1%}, {elapsed:.2f} с'
+            )
+        hits = sum(result[0] for result in results)
+        misses = sum(result[1] for result in results)
+        self.stdout.write(
+            f'Итого: {hits / ((hits + misses) or 1):.1%} попаданий, '
+            f'{misses} постов прочитано из БД'
+        )
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from posts.models import Post, UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Стоимость раскладки постов по лентам подписчиков для каждого '
+        'автора: помогает подобрать TIMELINE_FANOUT_THRESHOLD.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='За сколько последних дней учитывать посты.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько самых дорогих авторов показать.',
+        )
+        parser.add_argument(
+            '--threshold', type=int,
+            default=settings.TIMELINE_FANOUT_THRESHOLD,
+            help='Порог подписчиков для оценки числа записей; режим '
+                 'в таблице — текущий (UserStats.pulled).',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        threshold = options['threshold']
+        # подписчиков берём из счётчика, а посты считаем подзапросом:
+        # соединение подписок с постами разрослось бы как раз у тех
+        # авторов, ради которых отчёт и нужен
+        recent_posts = Post.objects.filter(
+            author=OuterRef('user'), pub_date__gte=since
+        ).order_by().values('author').annotate(
+            total=Count('pk')).values('total')
+        authors = UserStats.objects.filter(followers_count__gt=0).annotate(
+            recent_posts=Coalesce(
+                Subquery(recent_posts, output_field=IntegerField()), 0),
+        ).values_list(
+            'user__username', 'followers_count', 'recent_posts', 'pulled')
+        rows = sorted(
+            (
+                (username, followers, posts, followers * posts, pulled)
+                for username, followers, posts, pulled in authors
+            ),
+            key=lambda row: row[3],
+            reverse=True,
+        )
+        self.stdout.write(
+            f'{"автор":<30} {"подписчики":>10} {"посты":>7} '
+            f'{"записи":>10}  режим'
+        )
+        for username, followers, posts, writes, pulled in rows[
+                :options['limit']]:
+            mode = 'pull' if pulled else 'push'
+            self.stdout.write(
+                f'{username:<30} {followers:>10} {posts:>7} '
+                f'{writes:>10}  {mode}'
+            )
+        pushed_writes = sum(
+            writes for _, followers, _, writes, _ in rows
+            if followers <= threshold
+        )
+        self.stdout.write(
+            f'Записей в ленты за {options["days"]} дн. при пороге '
+            f'{threshold}: {pushed_writes}'
+        )
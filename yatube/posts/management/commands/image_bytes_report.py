@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import default_size, ready_thumbnails, thumbnail_sizes
+
+# ширина окна в CSS-пикселях и плотность экрана
+CLIENTS = (
+    ('телефон 1x', 360, 1),
+    ('телефон', 360, 2),
+    ('планшет', 768, 2),
+    ('ноутбук', 1280, 1),
+)
+
+
+def pick(candidates, need):
+    """Вариант, который выберет браузер по srcset: наименьший не уже need."""
+    wide_enough = [item for item in candidates if item[0] >= need]
+    if wide_enough:
+        return min(wide_enough)
+    return max(candidates)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сколько байт картинок весит первая страница ленты: оригиналы, '
+        'одно превью 960x339 и варианты из srcset для разных экранов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=settings.POSTS_LIMIT,
+            help='Сколько последних постов с картинками учитывать.',
+        )
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.exclude(image='')[:options['posts']])
+        if not posts:
+            self.stderr.write('Нет постов с картинками.')
+            return
+        sizes = thumbnail_sizes()
+        ready = ready_thumbnails(post.image for post in posts)
+        totals = {'оригиналы': 0, 'одно превью': 0}
+        totals.update((name, 0) for name, _, _ in CLIENTS)
+        for post in posts:
+            original = post.image.size
+            totals['оригиналы'] += original
+            thumbnails = ready.get(post.image.name, {})
+            files = {
+                size: thumbnail.storage.size(thumbnail.name)
+                for size, thumbnail in thumbnails.items() if thumbnail
+            }
+            totals['одно превью'] += files.get(default_size(), original)
+            for name, width, density in CLIENTS:
+                need = min(width, settings.THUMBNAIL_CARD_SIZE[0]) * density
+                # браузер берёт первый поддерживаемый формат из <picture>
+                for format_ in settings.THUMBNAIL_FORMATS:
+                    candidates = [
+                        (thumbnails[size].width, files[size])
+                        for size, (_, params) in sizes.items()
+                        if params['format'] == format_ and size in files
+                    ]
+                    if candidates:
+                        totals[name] += pick(candidates, need)[1]
+                        break
+                else:
+                    totals[name] += original
+        baseline = totals['одно превью']
+        self.stdout.write(f'Постов с картинками: {len(posts)}')
+        for name, total in totals.items():
+            share = total / baseline * 100 if baseline else 0
+            self.stdout.write(
+                f'{name:<15} {total / 1024:>10.1f} КБ {share:>6.0f}%')
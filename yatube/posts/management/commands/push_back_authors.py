@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Возвращает к раскладке по лентам авторов, у которых подписчиков '
+        'стало не больше TIMELINE_PUSH_BACK_THRESHOLD, и дописывает их '
+        'посты в ленты подписчиков. Запускается по расписанию.'
+    )
+
+    def handle(self, *args, **options):
+        pushed = sum(
+            timeline.push_back(author_id)
+            for author_id in list(timeline.authors_to_push_back())
+        )
+        self.stdout.write(f'Возвращено к раскладке авторов: {pushed}')
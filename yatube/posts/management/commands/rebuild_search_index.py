@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import backend
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс постов.'
+
+    def handle(self, *args, **options):
+        search = backend()
+        posts = Post.objects.order_by('id').only('id', 'text')
+        total = 0
+        with transaction.atomic():
+            search.clear()
+            batch = []
+            for post in posts.iterator(chunk_size=BATCH_SIZE):
+                batch.append(post)
+                if len(batch) == BATCH_SIZE:
+                    search.index(batch)
+                    total += len(batch)
+                    batch = []
+            search.index(batch)
+            total += len(batch)
+        self.stdout.write(f'Проиндексировано постов: {total}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики постов, комментариев и подписок с реальными '
+        'COUNT(*) и исправляет разошедшиеся строки.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = reconcile()
+        self.stdout.write(
+            f'Исправлено счётчиков пользователей: {fixed["users"]}, '
+            f'постов: {fixed["posts"]}'
+        )
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+from posts.search import document
+
+BATCH_SIZE = 1000
+
+
+def create_index(apps, schema_editor):
+    # FTS5 есть только у SQLite; для других баз индекс ведёт свой бэкенд
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5(body, '
+            "tokenize = 'unicode61 remove_diacritics 0')"
+        )
+        posts = Post.objects.order_by('id').values_list('id', 'text')
+        batch = []
+        for pk, text in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append((pk, document(text)))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(
+                    'INSERT INTO posts_search (rowid, body) VALUES (%s, %s)',
+                    batch,
+                )
+                batch = []
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, body) VALUES (%s, %s)', batch)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,210 @@
+import re
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.db import connection
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from .cache import hydrate_posts
+
+WORD = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+
+# окончания из русского стеммера Snowball; search ищет самое левое
+# совпадение, то есть самое длинное окончание
+PERFECTIVE_GERUND = re.compile(
+    r'((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$')
+REFLEXIVE = re.compile(r'(ся|сь)$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))$')
+VERB = re.compile(
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)|'
+    r'(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+
+
+def _regions(word):
+    """Начала областей RV и R2 из описания стеммера Snowball."""
+    rv = r1 = r2 = len(word)
+    for position, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = position + 1
+            break
+    for position in range(1, len(word)):
+        if word[position - 1] in VOWELS and word[position] not in VOWELS:
+            r1 = position + 1
+            break
+    for position in range(r1 + 1, len(word)):
+        if word[position - 1] in VOWELS and word[position] not in VOWELS:
+            r2 = position + 1
+            break
+    return rv, r2
+
+
+def _cut(pattern, text):
+    match = pattern.search(text)
+    if match is None:
+        return text, False
+    return text[:match.start()], True
+
+
+def stem(word):
+    """Основа русского слова (Snowball); прочие слова не меняются."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+    tail, found = _cut(PERFECTIVE_GERUND, tail)
+    if not found:
+        tail, _ = _cut(REFLEXIVE, tail)
+        tail, found = _cut(ADJECTIVE, tail)
+        if found:
+            tail, _ = _cut(PARTICIPLE, tail)
+        else:
+            tail, found = _cut(VERB, tail)
+            if not found:
+                tail, _ = _cut(NOUN, tail)
+    if tail.endswith('и'):
+        tail = tail[:-1]
+    match = DERIVATIONAL.search(tail)
+    if match is not None and rv + match.start() >= r2:
+        tail = tail[:match.start()]
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    else:
+        tail, found = _cut(SUPERLATIVE, tail)
+        if found and tail.endswith('нн'):
+            tail = tail[:-1]
+        elif not found and tail.endswith('ь'):
+            tail = tail[:-1]
+    return head + tail
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def document(text):
+    """Текст для индекса: основы через пробел."""
+    return ' '.join(terms(text))
+
+
+class SearchBackend:
+    """Индекс для поиска по постам.
+
+    Бэкенд выбирается настройкой POSTS_SEARCH_BACKEND; в индекс
+    попадают основы слов (см. terms), поэтому стемминг не зависит
+    от возможностей базы.
+    """
+
+    def index(self, posts):
+        raise NotImplementedError
+
+    def remove(self, pks):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query_terms, offset, limit):
+        """id постов по убыванию релевантности."""
+        raise NotImplementedError
+
+    def count(self, query_terms, limit):
+        """Число найденных постов, но не больше limit."""
+        raise NotImplementedError
+
+
+class SqliteFTSBackend(SearchBackend):
+    """Виртуальная таблица FTS5 с rowid = Post.id (миграция 0014)."""
+    table = 'posts_search'
+
+    @staticmethod
+    def match(query_terms):
+        # основы состоят из букв и цифр, кавычки не нужно экранировать
+        return ' '.join(f'"{term}"' for term in query_terms)
+
+    def index(self, posts):
+        rows = [(post.pk, document(post.text)) for post in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows],
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+                rows,
+            )
+
+    def remove(self, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk in pks],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, query_terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [self.match(query_terms), limit, offset],
+            )
+            return [pk for pk, in cursor.fetchall()]
+
+    def count(self, query_terms, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} '
+                f'WHERE {self.table} MATCH %s LIMIT %s)',
+                [self.match(query_terms), limit],
+            )
+            return cursor.fetchone()[0]
+
+
+def backend():
+    return import_string(settings.POSTS_SEARCH_BACKEND)()
+
+
+class SearchResults(Sequence):
+    """Найденные посты для Paginator.
+
+    Число результатов ограничено POSTS_SEARCH_MAX_RESULTS: и подсчёт,
+    и глубина OFFSET не растут вместе с таблицей.
+    """
+
+    def __init__(self, query):
+        self.terms = terms(query)
+        self.backend = backend()
+
+    @cached_property
+    def _count(self):
+        if not self.terms:
+            return 0
+        return self.backend.count(
+            self.terms, settings.POSTS_SEARCH_MAX_RESULTS)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self._count)
+        if start >= stop:
+            return []
+        pks = self.backend.search(self.terms, start, stop - start)
+        return hydrate_posts(pks)
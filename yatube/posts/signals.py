@@ -0,0 +1,187 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import events, search, suggest, thumbnails, timeline
+from .cache import bump_generation, invalidate_posts
+from .counters import change_comments_count, change_user_stats
+from .follows import followed, unfollowed
+from .images import keep_upload, release_image, restore_upload
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import feed_count_key, invalidate_feed_counts
+
+
+def post_count_keys(post):
+    keys = [
+        feed_count_key('index'),
+        feed_count_key('author', post.author_id),
+        feed_count_key('group', post.group_id),
+    ]
+    if not timeline.is_pulled(post.author_id):
+        # ленты подписчиков «тяжёлых» авторов считают их посты отдельно
+        followers = Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True)
+        keys += [feed_count_key('follow', user_id) for user_id in followers]
+    return keys
+
+
+def post_feeds(post, *group_ids):
+    feeds = ['index', f'author:{post.author_id}']
+    feeds += [
+        f'group:{group_id}' for group_id in (post.group_id, *group_ids)
+        if group_id
+    ]
+    return feeds
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    keep_upload(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    previous_group = loaded.get('group_id', instance.group_id)
+    bump_generation(*post_feeds(instance, previous_group))
+    invalidate_posts(instance.pk)
+    if created:
+        change_user_stats(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+        events.publish_post(instance)
+        invalidate_feed_counts(*post_count_keys(instance))
+    elif previous_group != instance.group_id:
+        invalidate_feed_counts(
+            feed_count_key('group', previous_group),
+            feed_count_key('group', instance.group_id),
+        )
+    if created or loaded.get('text') != instance.text:
+        search.backend().index([instance])
+    previous_image = loaded.get('image')
+    restore_upload(instance)
+    if instance.image and previous_image != instance.image.name:
+        thumbnails.schedule_thumbnails(instance.image.name)
+    if previous_image and previous_image != instance.image.name:
+        release_image(previous_image)
+    loaded['group_id'] = instance.group_id
+    loaded['image'] = instance.image.name
+    loaded['text'] = instance.text
+    instance._loaded_values = loaded
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_user_stats(instance.author_id, posts_count=-1)
+    search.backend().remove([instance.pk])
+    if instance.image:
+        release_image(instance.image.name)
+    bump_generation(*post_feeds(instance))
+    invalidate_posts(instance.pk)
+    invalidate_feed_counts(*post_count_keys(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # название группы выводится и в общей ленте, и в профилях авторов
+    posts = Post.objects.filter(group=instance)
+    posts.update(updated=timezone.now())
+    invalidate_posts(*posts.values_list('id', flat=True))
+    authors = posts.order_by().values_list(
+        'author_id', flat=True).distinct()
+    bump_generation(
+        'index',
+        f'group:{instance.id}',
+        *(f'author:{author_id}' for author_id in authors),
+    )
+
+
+# поля пользователя, которые выводятся в карточках постов
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def user_card_values(user):
+    # отложенные поля не читаем: это был бы запрос на каждый User
+    return {name: user.__dict__.get(name) for name in USER_CARD_FIELDS}
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    # User — модель django.contrib.auth, from_db у неё не переопределить
+    instance._loaded_values = user_card_values(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    values = user_card_values(instance)
+    changed = values != getattr(instance, '_loaded_values', None)
+    instance._loaded_values = values
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        return
+    # вход, смена пароля и правка прочих полей ленты не меняют
+    if not changed:
+        return
+    posts = Post.objects.filter(author=instance)
+    posts.update(updated=timezone.now())
+    invalidate_posts(*posts.values_list('id', flat=True))
+    groups = posts.order_by().values_list('group_id', flat=True).distinct()
+    bump_generation(
+        'index',
+        f'author:{instance.id}',
+        *(f'group:{group_id}' for group_id in groups if group_id),
+    )
+
+
+# подписки из views идут мимо ORM (posts.follows), сигналы остаются
+# для админки, каскадных удалений и прочего кода на моделях
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+        events.publish_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Group)
+def group_suggest_saved(sender, instance, **kwargs):
+    suggest.prefix_index.update(*suggest.group_entry(
+        instance.id, instance.title, instance.slug))
+
+
+@receiver(post_delete, sender=Group)
+def group_suggest_deleted(sender, instance, **kwargs):
+    suggest.prefix_index.remove(('group', instance.id))
+
+
+@receiver(post_save, sender=User)
+def user_suggest_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields == frozenset({'last_login'}):
+        return
+    if not instance.is_active:
+        suggest.prefix_index.remove(('user', instance.id))
+        return
+    suggest.prefix_index.update(*suggest.user_entry(
+        instance.id, instance.username,
+        instance.first_name, instance.last_name))
+
+
+@receiver(post_delete, sender=User)
+def user_suggest_deleted(sender, instance, **kwargs):
+    suggest.prefix_index.remove(('user', instance.id))
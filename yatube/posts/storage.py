@@ -0,0 +1,59 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы по sha256 содержимого: posts/ab/cd/abcd….jpg.
+
+    Одинаковые загрузки сохраняются один раз, а два уровня подкаталогов
+    не дают одному каталогу разрастись до миллионов файлов.
+    """
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return self.ensure(self.hashed_name(name, digest.hexdigest()), content)
+
+    def ensure(self, name, content):
+        """Записывает файл под готовым именем, если его ещё нет."""
+        if self.exists(name):
+            return name
+        content.seek(0)
+        saved = self._save(name, content)
+        if saved != name:
+            # тот же файл успел записать параллельный запрос
+            self.delete(saved)
+        return name
+
+    def retire(self, name):
+        """Атомарно убирает файл под временное имя; None — файла нет.
+
+        Пока файл убран, новая загрузка того же содержимого не найдёт его
+        и запишет заново, а освобождающий может вернуть его через restore.
+        """
+        retired = f'{name}.{uuid.uuid4().hex}.retired'
+        try:
+            os.rename(self.path(name), self.path(retired))
+        except FileNotFoundError:
+            return None
+        return retired
+
+    def restore(self, retired, name):
+        os.replace(self.path(retired), self.path(name))
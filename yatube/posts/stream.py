@@ -0,0 +1,147 @@
+import asyncio
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import HttpRequest
+
+from .events import bus
+from .models import Follow, Group, User
+
+# поток событий отдаётся в обход Django-представлений (см. yatube/asgi.py):
+# соединение живёт долго и держит только корутину, а не поток
+PREFIX = '/stream/'
+ROUTES = (
+    (re.compile(r'^$'), 'index'),
+    (re.compile(r'^group/(?P<slug>[-a-zA-Z0-9_]+)/$'), 'group'),
+    (re.compile(r'^profile/(?P<username>[^/]+)/$'), 'profile'),
+    (re.compile(r'^follow/$'), 'follow'),
+)
+
+
+def session_user(headers):
+    cookie = SimpleCookie()
+    cookie.load(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+        morsel.value if morsel else None)
+    return get_user(request)
+
+
+def resolve_channels(feed, params, headers):
+    """Каналы шины для ленты; None — ленты нет или она недоступна."""
+    try:
+        if feed == 'index':
+            return ['index']
+        if feed == 'group':
+            group = Group.objects.filter(
+                slug=params['slug']).values_list('id', flat=True).first()
+            return None if group is None else [f'group:{group}']
+        if feed == 'profile':
+            author = User.objects.filter(
+                username=params['username']).values_list(
+                    'id', flat=True).first()
+            return None if author is None else [f'author:{author}']
+        user = session_user(headers)
+        if not user.is_authenticated:
+            return None
+        # лента подписок — это каналы авторов на момент подключения
+        authors = Follow.objects.filter(
+            user=user).values_list('author_id', flat=True)
+        return [f'author:{author}' for author in authors]
+    finally:
+        close_old_connections()
+
+
+def format_event(event):
+    lines = [f'event: {event["event"]}', f'id: {event["id"]}']
+    lines += [f'data: {line}' for line in event['data'].splitlines()]
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def send_status(send, status):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def pump(send, subscription):
+    while True:
+        try:
+            event = await subscription.get(settings.STREAM_KEEPALIVE)
+        except asyncio.TimeoutError:
+            # комментарий SSE не даёт прокси закрыть простаивающее соединение
+            await send({
+                'type': 'http.response.body',
+                'body': b': keepalive\n\n',
+                'more_body': True,
+            })
+            continue
+        await send({
+            'type': 'http.response.body',
+            'body': format_event(event),
+            'more_body': True,
+        })
+
+
+async def stream(scope, receive, send):
+    """ASGI-приложение Server-Sent Events: новые посты и комментарии.
+
+    /stream/ — вся лента, /stream/group/<slug>/, /stream/profile/<username>/
+    и /stream/follow/ (по сессии) — как соответствующие ленты сайта.
+    """
+    path = scope['path'][len(PREFIX):]
+    for pattern, feed in ROUTES:
+        match = pattern.match(path)
+        if match:
+            break
+    else:
+        return await send_status(send, 404)
+    if scope['method'] != 'GET':
+        return await send_status(send, 405)
+    channels = await sync_to_async(resolve_channels)(
+        feed, match.groupdict(), dict(scope['headers']))
+    if channels is None:
+        return await send_status(send, 404 if feed != 'follow' else 401)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': f'retry: {settings.STREAM_RETRY}\n\n'.encode(),
+        'more_body': True,
+    })
+    subscription = bus.subscribe(channels)
+    pumping = asyncio.ensure_future(pump(send, subscription))
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await asyncio.wait(
+            (pumping, disconnect), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        subscription.close()
+        for task in (pumping, disconnect):
+            task.cancel()
+    if pumping.done() and not pumping.cancelled():
+        # ошибка отправки (например, клиент ушёл) не должна теряться молча
+        pumping.result()
@@ -0,0 +1,197 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache
+from django.db import transaction
+from django.urls import NoReverseMatch, reverse
+
+from .cache import bump_generation, generation_key, get_generation
+from .models import Group, User
+
+# поколение индекса подсказок общее для всех процессов; каждое изменение
+# публикуется в кэше под своим поколением, и остальные процессы применяют
+# его к своей копии. Из базы копия перестраивается, только если журнал
+# изменений вытеснен или отстал слишком далеко
+GENERATION = 'suggest'
+
+
+def change_key(generation):
+    return f'posts:suggest:change:{generation}'
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def index_keys(*names):
+    """Ключи записи: каждое название целиком и каждое его слово."""
+    keys = set()
+    for name in map(normalize, names):
+        if name:
+            keys.add(name)
+            keys.update(name.split())
+    return keys
+
+
+def url(name, arg):
+    # старые группы могли получить slug, который не проходит в URL
+    try:
+        return reverse(name, args=[arg])
+    except NoReverseMatch:
+        return None
+
+
+def group_entry(pk, title, slug):
+    entry = {
+        'type': 'group',
+        'title': title,
+        'slug': slug,
+        'url': url('posts:group_list', slug),
+    }
+    return ('group', pk), index_keys(title, slug), entry
+
+
+def user_entry(pk, username, first_name, last_name):
+    full_name = f'{first_name} {last_name}'.strip()
+    entry = {
+        'type': 'user',
+        'title': full_name or username,
+        'username': username,
+        'url': url('posts:profile', username),
+    }
+    return ('user', pk), index_keys(username, full_name), entry
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей в памяти процесса.
+
+    Поиск по префиксу — bisect до первого подходящего ключа и проход
+    вперёд, пока ключи начинаются с префикса; к базе запрос не идёт,
+    в кэш — только за поколением и изменениями других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self._index_keys = {}
+        self.generation = None
+
+    def _load(self):
+        records = [
+            group_entry(*row)
+            for row in Group.objects.values_list('id', 'title', 'slug')
+        ]
+        records += [
+            user_entry(*row)
+            for row in User.objects.filter(is_active=True).values_list(
+                'id', 'username', 'first_name', 'last_name')
+        ]
+        return records
+
+    def rebuild(self):
+        generation = get_generation(GENERATION)
+        records = self._load()
+        with self._lock:
+            self._entries = {ident: entry for ident, _, entry in records}
+            self._index_keys = {ident: keys for ident, keys, _ in records}
+            self._keys = sorted(
+                (key, *ident)
+                for ident, keys, _ in records for key in keys
+            )
+            self.generation = generation
+
+    def _remove(self, ident):
+        for key in self._index_keys.pop(ident, ()):
+            position = bisect_left(self._keys, (key, *ident))
+            del self._keys[position]
+        self._entries.pop(ident, None)
+
+    def _set(self, ident, keys=None, entry=None):
+        self._remove(ident)
+        if entry is not None:
+            self._entries[ident] = entry
+            self._index_keys[ident] = keys
+            for key in keys:
+                insort(self._keys, (key, *ident))
+
+    def _publish(self, ident, keys=None, entry=None):
+        if type(caches['default']).incr is BaseCache.incr:
+            # incr без блокировки может выдать одно поколение двум
+            # процессам, и одно изменение затрёт другое: журнал не ведём,
+            # копии перестраиваются из базы
+            bump_generation(GENERATION)
+            return
+        try:
+            generation = cache.incr(generation_key(GENERATION))
+        except ValueError:
+            # поколение вытеснено: процессы перестроят копии из базы
+            bump_generation(GENERATION)
+            return
+        cache.set(change_key(generation), (ident, keys, entry),
+                  settings.SUGGEST_CHANGES_TIMEOUT)
+
+    def update(self, ident, keys, entry):
+        transaction.on_commit(lambda: self._publish(ident, keys, entry))
+
+    def remove(self, ident):
+        transaction.on_commit(lambda: self._publish(ident))
+
+    def _catch_up(self, generation):
+        """Применяет опубликованные изменения; False — журнала не хватает."""
+        start = self.generation
+        if start is None or not (
+                0 < generation - start <= settings.SUGGEST_CHANGES_LIMIT):
+            return False
+        keys = [
+            change_key(number) for number in range(start + 1, generation + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        with self._lock:
+            # другой поток мог успеть применить эти изменения раньше
+            if self.generation == start:
+                for key in keys:
+                    self._set(*changes[key])
+                self.generation = generation
+        return True
+
+    def _refresh(self, generation):
+        # перестраивает копию один поток; остальные пока отвечают по
+        # старой, и ждут только запросы к ещё не построенному индексу
+        if not self._rebuilding.acquire(blocking=self.generation is None):
+            return
+        try:
+            if self.generation != generation:
+                self.rebuild()
+        finally:
+            self._rebuilding.release()
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        generation = get_generation(GENERATION)
+        if self.generation != generation and not self._catch_up(generation):
+            self._refresh(generation)
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, *ident = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                ident = tuple(ident)
+                if ident not in seen:
+                    seen.add(ident)
+                    results.append(self._entries[ident])
+                position += 1
+        return results
+
+
+prefix_index = PrefixIndex()
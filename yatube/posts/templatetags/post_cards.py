@@ -0,0 +1,41 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import picture, ready_thumbnails
+
+register = template.Library()
+
+
+def card_cache_key(post):
+    return f'posts:card:{post.pk}:{post.updated.timestamp()}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов ленты: один get_many, рендер только промахов.
+
+    Превью картинок для промахов ищутся одним запросом на страницу.
+    """
+    cards = {card_cache_key(post): post for post in posts}
+    rendered = cache.get_many(cards.keys())
+    missing = {
+        key: post for key, post in cards.items() if key not in rendered
+    }
+    thumbnails = ready_thumbnails(post.image for post in missing.values())
+    missing = {
+        key: render_to_string(
+            'posts/includes/post_card.html',
+            {
+                'post': post,
+                'picture': picture(thumbnails.get(post.image.name, {})),
+            },
+        )
+        for key, post in missing.items()
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        rendered.update(missing)
+    return [mark_safe(rendered[key]) for key in cards]
@@ -0,0 +1,17 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(image):
+    """Варианты превью для <picture>, если они уже построены, иначе None.
+
+    Пока превью строятся, шаблон показывает оригинал картинки.
+    """
+    if not image:
+        return None
+    ready = thumbnails.ready_thumbnails([image])
+    return thumbnails.picture(ready.get(image.name, {}))
@@ -0,0 +1,141 @@
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(15)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(name, args=args), params)
+
+    def collect(self, name, *args, **params):
+        """Все страницы ответа по курсору next."""
+        results = []
+        cursor = ''
+        while cursor is not None:
+            data = self.get(name, *args, cursor=cursor, **params).json()
+            results += data['results']
+            cursor = data['next']
+        return results
+
+    def newest_first(self, posts):
+        return [post.id for post in sorted(
+            posts, key=lambda post: (post.pub_date, post.id), reverse=True)]
+
+    def test_feeds_walk_all_posts(self):
+        cases = (
+            (('posts:api_posts',), self.posts),
+            (('posts:api_group_posts', 'group'),
+             [post for post in self.posts if post.group_id]),
+            (('posts:api_profile_posts', 'writer'), self.posts),
+            (('posts:api_follow_posts',), self.posts),
+        )
+        for args, expected in cases:
+            with self.subTest(view=args[0]):
+                results = self.collect(*args, fields='id')
+                self.assertEqual(
+                    [row['id'] for row in results],
+                    self.newest_first(expected),
+                )
+
+    def test_field_selection(self):
+        data = self.get(
+            'posts:api_posts', fields='id,author,group', limit=1).json()
+        newest = self.posts[-1]
+        self.assertEqual(data['results'], [
+            {'id': newest.id, 'author': 'writer', 'group': None},
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            self.get('posts:api_posts', fields='id')
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('auth_user', sql)
+
+    def test_invalid_parameters(self):
+        for params in ({'fields': 'id,password'}, {'limit': '0'},
+                       {'limit': '1000'}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                response = self.get('posts:api_posts', **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_malformed_cursor_starts_over(self):
+        cursor = urlsafe_b64encode(b'[1,[null,null]]').decode()
+        for name in ('posts:api_posts', 'posts:api_groups'):
+            with self.subTest(name=name):
+                response = self.get(name, cursor=cursor)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.json()['previous'])
+
+    def test_previous_cursor(self):
+        first = self.get('posts:api_posts', fields='id', limit=5).json()
+        second = self.get(
+            'posts:api_posts', fields='id', limit=5,
+            cursor=first['next']).json()
+        back = self.get(
+            'posts:api_posts', fields='id', limit=5,
+            cursor=second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_comments_groups_follows(self):
+        post = self.posts[0]
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'Комментарий {number}')
+        comments = self.collect(
+            'posts:api_post_comments', post.id, fields='text,author')
+        self.assertEqual(comments, [
+            {'text': f'Комментарий {number}', 'author': 'reader'}
+            for number in range(3)
+        ])
+        self.assertEqual(
+            self.collect('posts:api_groups', fields='slug'),
+            [{'slug': 'group'}],
+        )
+        self.assertEqual(
+            self.collect('posts:api_follows', fields='author'),
+            [{'author': 'writer'}],
+        )
+
+    def test_comments_of_unknown_post(self):
+        response = self.get('posts:api_post_comments', 0)
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_requires_login(self):
+        self.client.logout()
+        for name in ('posts:api_follow_posts', 'posts:api_follows'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 401)
+
+    def test_compact_utf8(self):
+        response = self.get('posts:api_posts', fields='text', limit=1)
+        self.assertIn('"text":"Пост 14"'.encode(), response.content)
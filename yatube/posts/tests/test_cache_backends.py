@@ -0,0 +1,68 @@
+import multiprocessing
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from posts.cache import bump_generation, get_generation
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+def bump_in_worker(feed, times=1):
+    for _ in range(times):
+        bump_generation(feed)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': TEMP_CACHE_DIR,
+    }
+})
+class SharedCacheTest(SimpleTestCase):
+    """Общий бэкенд кэша сбрасывает ленты во всех воркерах."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generation_bumped_in_other_process(self):
+        generation = get_generation('index')
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=bump_in_worker, args=('index',))
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        self.assertGreater(get_generation('index'), generation)
+
+    def test_concurrent_bumps_are_not_merged(self):
+        generation = get_generation('index')
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=bump_in_worker, args=('index', 25))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(get_generation('index'), generation + 100)
+
+    def test_incr_keeps_timeout(self):
+        cache.set('forever', 1, None)
+        cache.set('short', 1, 60)
+        self.assertEqual(cache.incr('forever'), 2)
+        self.assertEqual(cache.incr('short'), 2)
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            self.assertEqual(cache.get('forever'), 2)
+            self.assertIsNone(cache.get('short'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
@@ -1,12 +1,15 @@
 import shutil
+import struct
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image, TiffImagePlugin, TiffTags
 
 from posts.models import Group, Post, Comment
 
@@ -14,6 +17,37 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def image_bytes(format_, exif=None, size=(400, 200)):
+    content = BytesIO()
+    params = {'exif': exif} if exif else {}
+    Image.new('RGB', size, (10, 200, 10)).save(content, format_, **params)
+    return content.getvalue()
+
+
+def multi_picture_jpeg(exif):
+    """JPEG с дополнительным снимком (MPO), как у камер телефонов."""
+    primary = image_bytes('JPEG', exif)
+    extra = image_bytes('JPEG', size=(40, 20))
+
+    def segment(extra_offset):
+        entries = TiffImagePlugin.ImageFileDirectory_v2(prefix=b'MM')
+        entries[0xB000] = b'0100'
+        entries.tagtype[0xB000] = TiffTags.UNDEFINED
+        entries[0xB001] = 2
+        entries.tagtype[0xB001] = TiffTags.LONG
+        entries[0xB002] = (
+            struct.pack('>LLLHH', 0x030000, len(primary), 0, 0, 0)
+            + struct.pack('>LLLHH', 0x020002, len(extra), extra_offset, 0, 0)
+        )
+        entries.tagtype[0xB002] = TiffTags.UNDEFINED
+        body = b'MPF\0MM\0*\0\0\0\x08' + entries.tobytes(8)
+        return b'\xff\xe2' + struct.pack('>H', len(body) + 2) + body
+
+    # смещение снимка считается от заголовка TIFF в сегменте APP2
+    extra_offset = len(primary) + len(segment(0)) - 10
+    return primary[:2] + segment(extra_offset) + primary[2:] + extra
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TaskCreateFormTests(TestCase):
     @classmethod
@@ -70,7 +104,50 @@ class TaskCreateFormTests(TestCase):
         first_post = Post.objects.first()
         self.assertEqual(first_post.text, templates_form_names['text'])
         self.assertEqual(first_post.group.id, templates_form_names['group'])
-        self.assertEqual(first_post.image, f"posts/{name}")
+        self.assertRegex(
+            first_post.image.name, r'^posts/\w\w/\w\w/[0-9a-f]{64}\.gif$')
+
+    @override_settings(POST_IMAGE_MAX_DIMENSION=100)
+    def test_image_normalized_on_upload(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой стрелке
+        exif[0x010F] = 'SecretCam'
+        uploads = {
+            'JPEG': ('photo.jpeg', image_bytes('JPEG', exif), '.jpg'),
+            'PNG': ('photo.png', image_bytes('PNG', exif), '.png'),
+            'MPO': ('photo.jpg', multi_picture_jpeg(exif), '.jpg'),
+        }
+        for format_, (name, content, extension) in uploads.items():
+            with self.subTest(format_):
+                uploaded = SimpleUploadedFile(name, content, 'image/jpeg')
+                self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={'text': f'Фото {format_}', 'image': uploaded})
+
+                post = Post.objects.get(text=f'Фото {format_}')
+                self.assertTrue(post.image.name.endswith(extension))
+                with Image.open(post.image.path) as image:
+                    self.assertEqual(image.format, format_.replace(
+                        'MPO', 'JPEG'))
+                    self.assertEqual(image.size, (50, 100))
+                    self.assertNotIn('exif', image.info)
+                    self.assertNotIn(0x010F, image.getexif())
+                with open(post.image.path, 'rb') as stored:
+                    self.assertNotIn(b'SecretCam', stored.read())
+
+    def test_image_too_large(self):
+        content = BytesIO()
+        Image.effect_noise((64, 64), 100).save(content, 'PNG')
+        uploaded = SimpleUploadedFile(
+            'huge.png', content.getvalue(), 'image/png')
+        with self.settings(POST_IMAGE_MAX_UPLOAD_SIZE=512):
+            response = self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Слишком большая', 'image': uploaded})
+        self.assertFalse(Post.objects.filter(text='Слишком большая').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 512\xa0байт')
 
     def test_edit_post(self):
         post = Post.objects.create(
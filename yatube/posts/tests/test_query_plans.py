@@ -0,0 +1,101 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import ENTRY_ORDERING, FollowFeed
+from posts.utils import KEYSET_ORDERING, keyset_slice
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент читают по индексам, без полного скана и сортировки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        cls.reader = User.objects.create_user(username='reader')
+        groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-')
+            for i in range(3)
+        ]
+        for author in authors[:3]:
+            Follow.objects.create(user=cls.reader, author=author)
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}',
+                author=authors[i % len(authors)],
+                group=groups[i % len(groups)] if i % 4 else None,
+            )
+            for i in range(300)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Коммент {i}')
+            for i in range(50)
+        )
+        cls.author = authors[0]
+        cls.group = groups[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, name, queryset):
+        plan = self.plan(queryset)
+        for step in plan:
+            with self.subTest(query=name, step=step):
+                self.assertFalse(
+                    step.startswith('SCAN') and 'USING' not in step,
+                    f'{name}: полный скан таблицы\n' + '\n'.join(plan))
+                self.assertNotIn(
+                    'TEMP B-TREE', step,
+                    f'{name}: сортировка без индекса\n' + '\n'.join(plan))
+
+    def feed_querysets(self):
+        key = [self.post.pub_date, self.post.id]
+        index = Post.objects.select_related('group', 'author')
+        group = self.group.posts.select_related('group', 'author')
+        profile = self.author.posts.select_related('group', 'author')
+        feed = FollowFeed(self.reader)
+        return {
+            'index': index[:10],
+            'index page 5': index[40:50],
+            'index cursor': keyset_slice(
+                index, KEYSET_ORDERING, key, True, 11),
+            'group': group[:10],
+            'group cursor': keyset_slice(
+                group, KEYSET_ORDERING, key, False, 11),
+            'group count': group.order_by(),
+            'profile': profile[:10],
+            'profile cursor': keyset_slice(
+                profile, KEYSET_ORDERING, key, True, 11),
+            'profile following': Follow.objects.filter(
+                user=self.reader, author=self.author),
+            'follow feed': keyset_slice(
+                feed.entries, ENTRY_ORDERING, None, True, 11),
+            'follow feed cursor': keyset_slice(
+                feed.entries, ENTRY_ORDERING, key, True, 11),
+            'followings': Follow.objects.filter(
+                user=self.reader).values_list('author_id', flat=True),
+            'followers': Follow.objects.filter(
+                author=self.author).values_list('user_id', flat=True),
+            'post comments': self.post.comments.select_related('author'),
+            'image references': Post.objects.filter(
+                image='posts/ab/cd/abcd.jpg').values('id'),
+        }
+
+    def test_feed_queries_use_indexes(self):
+        for name, queryset in self.feed_querysets().items():
+            self.assertIndexed(name, queryset)
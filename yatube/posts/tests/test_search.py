@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import SearchResults, backend, stem, terms
+
+User = get_user_model()
+
+
+class StemTest(TestCase):
+    def test_russian_forms_share_stem(self):
+        for word, expected in (
+            ('котов', 'кот'),
+            ('важнейшие', 'важн'),
+            ('вдохновения', 'вдохновен'),
+            ('гуляли', 'гуля'),
+            ('радость', 'радост'),
+            ('Ёлки', 'елк'),
+        ):
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_other_words_unchanged(self):
+        self.assertEqual(terms('Django 2.2'), ['django', '2', '2'])
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='searcher')
+
+    def create_post(self, text):
+        return Post.objects.create(author=self.user, text=text)
+
+    def found(self, query):
+        results = SearchResults(query)
+        return [post.pk for post in results[:len(results)]]
+
+    def test_finds_other_word_forms(self):
+        post = self.create_post('Мы гуляли с котами по весенней Москве')
+        self.create_post('Совсем другая запись')
+        self.assertEqual(self.found('кот гулять'), [post.pk])
+        self.assertEqual(self.found('весенний'), [post.pk])
+
+    def test_ranked_by_relevance(self):
+        rare = self.create_post('Кот, а рядом много разных других слов ещё')
+        often = self.create_post('Кот котом котов')
+        self.assertEqual(self.found('коты'), [often.pk, rare.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        post = self.create_post('Старый текст про собак')
+        post.text = 'Новый текст про котов'
+        post.save()
+        self.assertEqual(self.found('собака'), [])
+        self.assertEqual(self.found('кот'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('кот'), [])
+
+    def test_view_paginates_and_keeps_query(self):
+        for number in range(12):
+            self.create_post(f'Заметка номер {number}')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'заметки'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 12)
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BC')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'заметки', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_empty_query(self):
+        self.create_post('Запись')
+        response = self.client.get(reverse('posts:search'), {'q': '  ,'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+
+    @override_settings(POSTS_SEARCH_MAX_RESULTS=3)
+    def test_results_are_capped(self):
+        for _ in range(5):
+            self.create_post('Повтор')
+        self.assertEqual(len(SearchResults('повтор')), 3)
+
+    def test_search_uses_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN QUERY PLAN SELECT rowid FROM posts_search '
+                'WHERE posts_search MATCH %s ORDER BY rank LIMIT 10',
+                ['"кот"'],
+            )
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotIn('posts_post', plan)
+
+    def test_rebuild_command(self):
+        post = self.create_post('Потерянная запись')
+        backend().clear()
+        self.assertEqual(self.found('потерянный'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(self.found('потерянный'), [post.pk])
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        post = self.create_post('Кошки спят')
+        self.create_post('Собаки бегают')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошка'})
+        self.assertEqual(
+            [item.pk for item in response.context['cl'].result_list],
+            [post.pk],
+        )
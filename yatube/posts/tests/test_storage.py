@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from posts.models import Post
+from posts.storage import ContentAddressedStorage
+from posts.thumbnails import ready_thumbnail, render_thumbnails
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+@mock.patch('posts.images.transaction.on_commit', lambda job: job())
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reposter')
+
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text=name,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        directory, filename = os.path.split(first.image.name)
+        self.assertEqual(directory, f'posts/{filename[:2]}/{filename[2:4]}')
+        self.assertEqual(os.listdir(os.path.dirname(first.image.path)),
+                         [filename])
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.gif')
+        path = first.image.path
+        render_thumbnails(first.image.name)
+        thumbnail = ready_thumbnail(first.image, '480.jpeg')
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(thumbnail.exists())
+
+    def test_replaced_image_released(self):
+        post = self.create_post('meme.gif')
+        path = post.image.path
+        post = Post.objects.get(pk=post.pk)
+        post.image = ContentFile(SMALL_GIF + b'\0', 'other.gif')
+        post.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_upload_during_release_keeps_file(self):
+        first = self.create_post('meme.gif')
+        path = first.image.path
+        retire = ContentAddressedStorage.retire
+
+        def retire_then_upload(storage, name):
+            retired = retire(storage, name)
+            # пока файл убран, другой запрос успевает закоммитить пост
+            self.create_post('repost.gif')
+            return retired
+
+        with mock.patch.object(
+                ContentAddressedStorage, 'retire', retire_then_upload):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.listdir(os.path.dirname(path)),
+                         [os.path.basename(path)])
+
+    def test_upload_rewrites_file_released_before_commit(self):
+        first = self.create_post('meme.gif')
+        path = first.image.path
+        jobs = []
+        with mock.patch('posts.images.transaction.on_commit', jobs.append):
+            second = self.create_post('repost.gif')
+        # файл был, поэтому не записан; до коммита его удалил release_image
+        os.remove(path)
+        for job in jobs:
+            job()
+        self.assertEqual(second.image.path, path)
+        with open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
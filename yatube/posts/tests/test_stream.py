@@ -0,0 +1,193 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import Client, TestCase, override_settings
+
+from posts.events import bus
+from posts.models import Comment, Follow, Group, Post
+from yatube.asgi import application
+
+User = get_user_model()
+
+
+class StreamClient:
+    """Клиент ASGI: запрос уходит в application, ответ — в очередь."""
+
+    def __init__(self, path, cookie=''):
+        self.scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'cookie', cookie.encode())],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 10000),
+            'scheme': 'http',
+            'http_version': '1.1',
+            'root_path': '',
+        }
+        self.sent = asyncio.Queue()
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({'type': 'http.request', 'body': b''})
+        self.task = asyncio.ensure_future(
+            application(self.scope, self.incoming.get, self.sent.put))
+
+    async def receive(self, timeout=2):
+        return await asyncio.wait_for(self.sent.get(), timeout)
+
+    async def start(self):
+        """Статус ответа; для потока ещё и первый кадр с retry."""
+        start = await self.receive()
+        if start['status'] == 200 and self.scope['path'].startswith(
+                '/stream/'):
+            self.retry = await self.receive()
+        return start['status']
+
+    async def event(self):
+        message = await self.receive()
+        fields = dict(
+            line.split(': ', 1)
+            for line in message['body'].decode().strip().split('\n')
+        )
+        return fields['event'], json.loads(fields['data'])
+
+    async def close(self):
+        await self.incoming.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 2)
+
+
+@mock.patch('posts.events.transaction.on_commit', lambda job: job())
+# каналы вычисляются в потоке теста: его соединение закрывать нельзя
+@mock.patch('posts.stream.close_old_connections', lambda: None)
+class StreamTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='')
+        cls.other = Group.objects.create(
+            title='Собаки', slug='dogs', description='')
+
+    def setUp(self):
+        # как и тестовый Client: Django-запросы через ASGI не должны
+        # закрывать соединение с открытой транзакцией теста
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def create_post(self, text, group=None):
+        return Post.objects.create(author=self.author, text=text, group=group)
+
+    def test_group_stream_gets_its_posts_and_comments(self):
+        async def scenario():
+            client = StreamClient('/stream/group/cats/')
+            self.assertEqual(await client.start(), 200)
+            await sync_to_async(self.create_post)('Про собак', self.other)
+            post = await sync_to_async(self.create_post)(
+                'Про котов', self.group)
+            post_event = await client.event()
+            await sync_to_async(Comment.objects.create)(
+                post=post, author=self.reader, text='Мяу')
+            comment_event = await client.event()
+            await client.close()
+            return post, post_event, comment_event
+
+        post, post_event, comment_event = async_to_sync(scenario)()
+        kind, data = post_event
+        self.assertEqual(kind, 'post')
+        self.assertEqual(
+            (data['id'], data['text'], data['group'], data['author']),
+            (post.id, 'Про котов', 'cats', 'writer'),
+        )
+        kind, data = comment_event
+        self.assertEqual(kind, 'comment')
+        self.assertEqual((data['post'], data['text']), (post.id, 'Мяу'))
+        self.assertFalse(bus.listened(['index', f'group:{self.group.id}']))
+
+    def test_follow_stream_uses_session(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        web = Client()
+        web.force_login(self.reader)
+        cookie = f'sessionid={web.cookies["sessionid"].value}'
+
+        async def scenario():
+            guest = StreamClient('/stream/follow/')
+            guest_status = await guest.start()
+            client = StreamClient('/stream/follow/', cookie)
+            self.assertEqual(await client.start(), 200)
+            await sync_to_async(self.create_post)('Для подписчиков')
+            event = await client.event()
+            await client.close()
+            return guest_status, event
+
+        guest_status, (kind, data) = async_to_sync(scenario)()
+        self.assertEqual(guest_status, 401)
+        self.assertEqual(data['text'], 'Для подписчиков')
+
+    def test_unknown_feeds(self):
+        async def scenario():
+            statuses = []
+            for path in ('/stream/group/nope/', '/stream/profile/nobody/',
+                         '/stream/other/'):
+                statuses.append(await StreamClient(path).start())
+            return statuses
+
+        self.assertEqual(async_to_sync(scenario)(), [404, 404, 404])
+
+    @override_settings(STREAM_KEEPALIVE=0.01)
+    def test_keepalive(self):
+        async def scenario():
+            client = StreamClient('/stream/')
+            await client.start()
+            message = await client.receive()
+            await client.close()
+            return message['body']
+
+        self.assertEqual(async_to_sync(scenario)(), b': keepalive\n\n')
+
+    def test_idle_connections_do_not_take_threads(self):
+        async def scenario():
+            clients = [StreamClient('/stream/') for _ in range(500)]
+            for client in clients:
+                await client.start()
+            threads = threading.active_count()
+            await sync_to_async(self.create_post)('Всем')
+            events = [await client.event() for client in clients]
+            for client in clients:
+                await client.close()
+            return threads, events
+
+        before = threading.active_count()
+        threads, events = async_to_sync(scenario)()
+        self.assertLess(threads - before, 5)
+        self.assertEqual({data['text'] for _, data in events}, {'Всем'})
+
+    def test_slow_client_drops_events(self):
+        async def scenario():
+            subscription = bus.subscribe(['index'])
+            with override_settings(STREAM_QUEUE_SIZE=2):
+                slow = bus.subscribe(['index'])
+            for number in range(3):
+                bus.publish(['index'], {'n': number})
+            await asyncio.sleep(0)
+            subscription.close()
+            slow.close()
+            return subscription.queue.qsize(), slow.dropped
+
+        self.assertEqual(async_to_sync(scenario)(), (3, 1))
+
+    def test_site_served_through_asgi(self):
+        async def scenario():
+            client = StreamClient('/')
+            status = await client.start()
+            await client.receive()
+            return status
+
+        self.assertEqual(async_to_sync(scenario)(), 200)
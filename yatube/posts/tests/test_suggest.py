@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.cache import bump_generation
+from posts.models import Group
+from posts.suggest import (GENERATION, PrefixIndex, change_key, group_entry,
+                           prefix_index)
+
+User = get_user_model()
+
+
+@mock.patch('posts.suggest.transaction.on_commit', lambda job: job())
+class SuggestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.group = Group.objects.create(
+            title='Любители котов', slug='cats', description='')
+        self.user = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой')
+
+    def titles(self, prefix, limit=10):
+        return [item['title'] for item in prefix_index.search(prefix, limit)]
+
+    def test_matches_any_word_prefix(self):
+        self.assertEqual(self.titles('кот'), ['Любители котов'])
+        self.assertEqual(self.titles('ca'), ['Любители котов'])
+        self.assertEqual(self.titles('ТОЛ'), ['Лев Толстой'])
+        self.assertEqual(self.titles('le'), ['Лев Толстой'])
+        self.assertEqual(self.titles('лев т'), ['Лев Толстой'])
+        self.assertEqual(self.titles('x'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    def test_no_queries_per_keystroke(self):
+        self.titles('л')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.titles('л'), ['Лев Толстой', 'Любители котов'])
+
+    def test_updated_incrementally_on_signals(self):
+        self.titles('л')
+        with self.assertNumQueries(0):
+            self.titles('л')
+        self.group.title = 'Собачники'
+        self.group.save()
+        Group.objects.create(title='Ёжики', slug='hedgehogs', description='')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('кот'), [])
+            self.assertEqual(self.titles('соб'), ['Собачники'])
+            self.assertEqual(self.titles('еж'), ['Ёжики'])
+        self.user.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('тол'), [])
+
+    def test_rebuilt_after_change_in_other_process(self):
+        self.titles('л')
+        Group.objects.filter(pk=self.group.pk).update(title='Птицы')
+        self.assertEqual(self.titles('пти'), [])
+        bump_generation(GENERATION)
+        self.assertEqual(self.titles('пти'), ['Птицы'])
+
+    def test_changes_from_other_process_applied_without_rebuild(self):
+        self.titles('л')
+        other = PrefixIndex()
+        other.update(*group_entry(self.group.pk, 'Птицы', 'birds'))
+        other.remove(('user', self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('пти'), ['Птицы'])
+            self.assertEqual(self.titles('л'), [])
+
+    def test_no_change_log_without_atomic_incr(self):
+        self.titles('л')
+        other = PrefixIndex()
+        file_cache = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.cache_dir,
+        }
+        with override_settings(CACHES={'default': file_cache}):
+            cache.clear()
+            prefix_index.rebuild()
+            Group.objects.filter(pk=self.group.pk).update(title='Птицы')
+            other.update(*group_entry(self.group.pk, 'Птицы', 'birds'))
+            self.assertFalse(cache.get(change_key(
+                prefix_index.generation + 1)))
+            self.assertEqual(self.titles('пти'), ['Птицы'])
+
+    def test_single_rebuild_at_a_time(self):
+        self.titles('л')
+        Group.objects.filter(pk=self.group.pk).update(title='Птицы')
+        bump_generation(GENERATION)
+        # пока другой поток перестраивает индекс, отвечает старая копия
+        with prefix_index._rebuilding, self.assertNumQueries(0):
+            self.assertEqual(self.titles('люб'), ['Любители котов'])
+        self.assertEqual(self.titles('пти'), ['Птицы'])
+
+    def test_last_login_does_not_touch_index(self):
+        self.titles('л')
+        generation = prefix_index.generation
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(prefix_index.generation, generation)
+
+    @override_settings(SUGGEST_LIMIT=2)
+    def test_endpoint(self):
+        for number in range(3):
+            Group.objects.create(
+                title=f'Лига {number}', slug=f'league-{number}',
+                description='')
+        response = Client().get(reverse('posts:suggest'), {'q': 'лиг'})
+        results = response.json()['results']
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], {
+            'type': 'group',
+            'title': 'Лига 0',
+            'slug': 'league-0',
+            'url': reverse('posts:group_list', args=['league-0']),
+        })
@@ -0,0 +1,143 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, features
+
+from posts.models import Post
+from posts.thumbnails import (default_size, ready_thumbnail,
+                              ready_thumbnails, render_thumbnails,
+                              thumbnail_sizes)
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name):
+    # разные файлы, иначе хранилище сведёт их к одному
+    content = BytesIO()
+    color = tuple(name.encode()[:3].ljust(3, b'0'))
+    Image.new('RGB', (1200, 800), color).save(content, 'JPEG')
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='painter')
+
+    def test_original_shown_until_thumbnail_ready(self):
+        """Пока превью нет, страница не строит его и показывает оригинал"""
+        post = Post.objects.create(
+            author=self.user, text='картина', image=make_image('a.jpg'))
+        address = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        response = self.client.get(address)
+        self.assertContains(response, post.image.url)
+        self.assertIsNone(ready_thumbnail(post.image, default_size()))
+
+        render_thumbnails(post.image.name)
+        thumbnail = ready_thumbnail(post.image, default_size())
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        self.assertContains(self.client.get(address), thumbnail.url)
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            thumbnail.url)
+
+    def test_srcset_lists_every_width(self):
+        post = Post.objects.create(
+            author=self.user, text='картина', image=make_image('c.jpg'))
+        render_thumbnails(post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        for width in settings.THUMBNAIL_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        small = ready_thumbnail(post.image, '480.jpeg')
+        self.assertEqual((small.width, small.height), (480, 170))
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    def test_webp_source_preferred(self):
+        post = Post.objects.create(
+            author=self.user, text='картина', image=make_image('d.jpg'))
+        render_thumbnails(post.image.name)
+        self.assertIn('480.webp', thumbnail_sizes())
+        self.assertContains(
+            self.client.get(reverse('posts:index')),
+            '<source type="image/webp"')
+
+    def test_image_bytes_report(self):
+        post = Post.objects.create(
+            author=self.user, text='картина', image=make_image('e.jpg'))
+        render_thumbnails(post.image.name)
+        out = StringIO()
+        call_command('image_bytes_report', stdout=out)
+        self.assertIn('Постов с картинками: 1', out.getvalue())
+        self.assertIn('телефон', out.getvalue())
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_build_command_keeps_connection(self):
+        """Команда строит превью в своём потоке и не теряет соединение"""
+        for name in ('f.jpg', 'g.jpg'):
+            Post.objects.create(
+                author=self.user, text='картина', image=make_image(name))
+        out = StringIO()
+        call_command('build_thumbnails', stdout=out)
+        self.assertIn('Построено превью: 2', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_thumbnails_built_after_commit(self):
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        lambda job: job()):
+            post = Post.objects.create(
+                author=self.user, text='картина', image=make_image('b.jpg'))
+            self.assertIsNotNone(ready_thumbnail(post.image, default_size()))
+            with mock.patch('posts.thumbnails.render_thumbnails') as render:
+                post.text = 'та же картина'
+                post.save()
+            render.assert_not_called()
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        """Превью всей страницы ищутся одним запросом к kvstore"""
+        posts = [
+            Post.objects.create(
+                author=self.user, text=str(i), image=make_image(f'{i}.jpg'))
+            for i in range(3)
+        ]
+        render_thumbnails(posts[0].image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails = ready_thumbnails(post.image for post in posts)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(None, thumbnails[posts[0].image.name].values())
+        self.assertEqual(
+            set(thumbnails[posts[1].image.name].values()), {None})
+        with self.assertNumQueries(0):
+            ready_thumbnails(post.image for post in posts)
+
+    def test_index_queries_do_not_grow_with_images(self):
+        Post.objects.create(
+            author=self.user, text='первая', image=make_image('0.jpg'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(reverse('posts:index'))
+        for i in range(1, settings.POSTS_LIMIT):
+            Post.objects.create(
+                author=self.user, text=str(i), image=make_image(f'{i}.jpg'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(len(one), len(full))
@@ -1,17 +1,29 @@
 import shutil
 import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Page
+from django.db import connection
 from django import forms
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts.cache import hydrate_posts, hydration_stats
 from posts.forms import PostForm, CommentForm
-from posts.models import Group, Post, Follow, Comment
+from posts.models import (Group, Post, Follow, Comment, TimelineEntry,
+                          UserStats)
+from posts.templatetags.post_cards import post_cards
+from posts.utils import KeysetPaginator
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -149,6 +161,63 @@ class TaskPagesTests(TestCase):
         self.assertIsInstance(response.context.get('form'), CommentForm)
         self.first_page_info(response.context, is_page=False)
 
+    def test_post_detail_queries(self):
+        """post_detail выполняет одинаковое число запросов при любом
+        количестве комментариев"""
+        address = reverse('posts:post_detail',
+                          kwargs={'post_id': self.post.id})
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        guest = Client()
+        guest.get(address)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=User.objects.create_user(
+                username=f'commenter{i}'), text=f'Комментарий {i}')
+            for i in range(300)
+        )
+        # валидаторы для условного GET, пост с автором, комментарии
+        with self.assertNumQueries(3):
+            response = guest.get(address)
+        self.assertEqual(len(response.context['comments']),
+                         settings.COMMENTS_LIMIT)
+        self.assertNotContains(response, 'commenter299')
+        self.assertEqual(response.context['post'].author.stats.posts_count, 1)
+
+    def test_post_comments_pages(self):
+        """Комментарии догружаются порциями по курсору"""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_LIMIT + 5)
+        )
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        first = response.context['comments']
+        self.assertTrue(first.has_next())
+        address = reverse('posts:post_comments',
+                          kwargs={'post_id': self.post.id})
+        self.assertContains(response, f'{address}?cursor={first.next_cursor}')
+
+        with self.assertNumQueries(2):
+            fragment = self.client.get(
+                address, {'cursor': first.next_cursor})
+        self.assertTemplateUsed(fragment, 'posts/includes/comments.html')
+        self.assertNotContains(fragment, '<html')
+        self.assertEqual(len(fragment.context['comments']), 5)
+        self.assertContains(fragment, 'Комментарий 24')
+
+        data = self.client.get(
+            address, {'cursor': first.next_cursor, 'format': 'json'}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [f'Комментарий {i}' for i in range(20, 25)])
+        self.assertIsNone(data['next'])
+
+    def test_post_comments_unknown_post(self):
+        address = reverse('posts:post_comments', kwargs={'post_id': 0})
+        for params in ({}, {'format': 'json'}):
+            with self.subTest(params=params):
+                response = self.client.get(address, params)
+                self.assertEqual(response.status_code, 404)
+
     def test_post_edit_correct_context(self):
         """Шаблон post_edit сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -244,17 +313,88 @@ class TaskPagesTests(TestCase):
         """Проверка кэша для index"""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
+        with CaptureQueriesContext(connection) as queries:
+            response_old = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_old.content, posts)
+        self.assertFalse(
+            [q for q in queries if 'posts_post' in q['sql']],
+            'лента не взята из кэша')
+
         Post.objects.create(
             text='test_new_post',
             author=self.user,
         )
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
-        new_posts = response_new.content
-        self.assertNotEqual(old_posts, new_posts)
+        self.assertContains(response_new, 'test_new_post')
+
+    def test_cache_feed_pages(self):
+        """Страницы ленты кэшируются раздельно"""
+        for _ in range(settings.POSTS_LIMIT):
+            Post.objects.create(text='test_page_post', author=self.user)
+        first = self.authorized_client.get(reverse('posts:index'))
+        second = self.authorized_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertNotContains(first, self.post.text)
+        self.assertContains(second, self.post.text)
+
+    def test_post_card_cache(self):
+        """Карточка поста берётся из кэша до изменения поста"""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn(self.post.text, post_cards([post])[0])
+
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn(self.post.text, post_cards([post])[0])
+
+        post.save()
+        self.assertIn('Тихая правка', post_cards([post])[0])
+
+    def test_hydrate_posts(self):
+        """Страница собирается из кэша одним get_many, промахи — in_bulk"""
+        other = Post.objects.create(text='Второй пост', author=self.user)
+        ids = [other.id, self.post.id, 10 ** 6]
+        with self.assertNumQueries(1):
+            posts = hydrate_posts(ids)
+        self.assertEqual(posts, [other, self.post])
+        self.assertEqual(posts[1].group.title, self.group.title)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(hydrate_posts(ids[:2]), posts)
+        self.assertEqual(hydration_stats(), {'hits': 2, 'misses': 3})
+
+        other.text = 'Исправленный пост'
+        other.save()
+        self.assertEqual(hydrate_posts(ids)[0].text, 'Исправленный пост')
+
+    def test_cache_group_rename(self):
+        """Переименование группы сбрасывает кэш лент"""
+        address = reverse('posts:index')
+        self.authorized_client.get(address)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.save()
+        self.assertContains(
+            self.authorized_client.get(address), 'Переименованная группа')
+
+    def test_cache_author_rename(self):
+        """Кэш лент сбрасывает только смена имени автора"""
+        address = reverse('posts:index')
+        self.authorized_client.get(address)
+        user = User.objects.get(pk=self.user.pk)
+        updated = Post.objects.get(pk=self.post.pk).updated
+        with self.assertNumQueries(1):
+            user.set_password('новый пароль')
+            user.save()
+        user.is_staff = True
+        user.save(update_fields=['is_staff'])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+
+        user.first_name = 'Переименованный'
+        user.save()
+        self.assertNotEqual(
+            Post.objects.get(pk=self.post.pk).updated, updated)
+        self.assertContains(
+            self.authorized_client.get(address), 'Переименованный')
 
 
 class PaginatorViewsTest(TestCase):
@@ -281,6 +421,9 @@ class PaginatorViewsTest(TestCase):
         cls.authorised_client.force_login(cls.user)
         cls.guest_client = Client()
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         addresses = [
             reverse('posts:index'),
@@ -303,6 +446,94 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(response.context['page_obj']),
                              self.CREATE_POST)
 
+    def test_keyset_pages(self):
+        """Курсорная пагинация проходит ленту вперёд и назад без OFFSET"""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for address in addresses:
+            with self.subTest(address=address):
+                cache.clear()
+                first = self.authorised_client.get(
+                    address + '?cursor=').context['page_obj']
+                self.assertIsInstance(first.paginator, KeysetPaginator)
+                self.assertEqual(len(first), settings.POSTS_LIMIT)
+                self.assertFalse(first.has_previous())
+
+                second = self.authorised_client.get(
+                    f'{address}?cursor={first.next_cursor}'
+                ).context['page_obj']
+                self.assertEqual(len(second), self.CREATE_POST)
+                self.assertFalse(second.has_next())
+                self.assertTrue(
+                    set(first).isdisjoint(second), 'страницы пересекаются')
+
+                back = self.authorised_client.get(
+                    f'{address}?cursor={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                self.assertFalse(back.has_previous())
+
+    def test_cached_keyset_page_not_hydrated(self):
+        """Курсорная страница из кэша не собирает посты"""
+        address = reverse('posts:index') + '?cursor='
+        first = self.authorised_client.get(address)
+        with mock.patch('posts.views.hydrate_posts',
+                        wraps=hydrate_posts) as hydrate:
+            second = self.authorised_client.get(address)
+        hydrate.assert_not_called()
+        self.assertEqual(second.content, first.content)
+
+    def test_keyset_page_without_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        paginator = KeysetPaginator(Post.objects.all(), settings.POSTS_LIMIT)
+        first = paginator.get_page('')
+        with CaptureQueriesContext(connection) as queries:
+            paginator.get_page(first.next_cursor)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+        self.assertNotIn('OFFSET', queries[0]['sql'].upper())
+
+    def test_count_served_from_cache(self):
+        """Число постов ленты берётся из кэша и сбрасывается сигналами"""
+        address = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.authorised_client.get(address)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorised_client.get(address)
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         settings.POSTS_LIMIT + self.CREATE_POST)
+
+        Post.objects.create(author=self.user, text='Ещё', group=self.group)
+        response = self.authorised_client.get(address)
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         settings.POSTS_LIMIT + self.CREATE_POST + 1)
+
+    @override_settings(POSTS_LIMIT=1, POSTS_PAGE_WINDOW=2)
+    def test_page_window(self):
+        response = self.authorised_client.get(
+            reverse('posts:profile', kwargs={'username': self.user})
+            + '?page=6')
+        self.assertEqual(list(response.context['page_obj'].page_window),
+                         [4, 5, 6, 7, 8])
+
+    def test_invalid_cursor_returns_first_page(self):
+        cursors = ['broken!'] + [
+            urlsafe_b64encode(raw.encode()).decode()
+            for raw in ('[1,[null,null]]', '[1,["2020-01-01T00:00:00",1,2]]',
+                        '[1,["2020-01-01T00:00:00",99999999999999999999]]')
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.authorised_client.get(
+                    reverse('posts:index'), {'cursor': cursor})
+                page = response.context['page_obj']
+                self.assertEqual(len(page), settings.POSTS_LIMIT)
+                self.assertFalse(page.has_previous())
+
 
 class FollowTest(TestCase):
     def setUp(self):
@@ -346,6 +577,40 @@ class FollowTest(TestCase):
         ).exists()
         self.assertFalse(follow_not_exists)
 
+    def test_follow_is_idempotent(self):
+        follow = reverse('posts:profile_follow', args=['Second'])
+        unfollow = reverse('posts:profile_unfollow', args=['Second'])
+        for address in (follow, follow):
+            self.assertEqual(
+                self.client_auth_follower.get(address).status_code, 302)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.stats(self.user_following).followers_count, 1)
+        for address in (unfollow, unfollow):
+            self.assertEqual(
+                self.client_auth_follower.get(address).status_code, 302)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(self.user_following).followers_count, 0)
+        self.client_auth_following.get(follow)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_unknown_user(self):
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.client_auth_follower.get(
+                    reverse(name, args=['nobody']))
+                self.assertEqual(response.status_code, 404)
+
+    def test_follow_single_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client_auth_follower.get(
+                reverse('posts:profile_follow', args=['Second']))
+        statements = [
+            query['sql'] for query in queries.captured_queries
+            if 'posts_follow' in query['sql']
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('ON CONFLICT DO NOTHING', statements[0])
+
     def test_subscription_feed(self):
         Follow.objects.create(
             user=self.user_follower, author=self.user_following)
@@ -359,3 +624,434 @@ class FollowTest(TestCase):
             reverse('posts:follow_index')
         )
         self.assertNotIn(self.post, response.context['page_obj'].object_list)
+
+    def test_timeline_fan_out_and_trim(self):
+        """Посты раскладываются подписчикам и убираются при отписке"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        new_post = Post.objects.create(
+            author=self.user_following, text='после подписки')
+        entries = TimelineEntry.objects.filter(user=self.user_follower)
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {self.post.id, new_post.id})
+
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [new_post, self.post])
+
+        Follow.objects.filter(
+            user=self.user_follower, author=self.user_following).delete()
+        self.assertFalse(entries.exists())
+
+    def test_follow_feed_queries(self):
+        """Лента подписок читается без запросов на каждый пост"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        for _ in range(5):
+            Post.objects.create(author=self.user_following, text='пост')
+        self.client_auth_follower.get(reverse('posts:follow_index'))
+        with CaptureQueriesContext(connection) as small:
+            self.client_auth_follower.get(reverse('posts:follow_index'))
+        for _ in range(5):
+            Post.objects.create(author=self.user_following, text='пост')
+        cache.clear()
+        self.client_auth_follower.get(reverse('posts:follow_index'))
+        with CaptureQueriesContext(connection) as large:
+            self.client_auth_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(len(small), len(large))
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_pulled_author_merged_on_read(self):
+        """Посты автора выше порога подмешиваются в ленту при чтении"""
+        reader = User.objects.create_user(username='Third')
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        Follow.objects.create(user=reader, author=self.user_following)
+        Follow.objects.create(
+            user=self.user_follower, author=reader)
+        cache.clear()
+
+        pulled_post = Post.objects.create(
+            author=self.user_following, text='без раскладки')
+        pushed_post = Post.objects.create(author=reader, text='разложен')
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=pulled_post).exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_follower, post=pushed_post).exists())
+
+        expected = [pushed_post, pulled_post, self.post]
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), expected)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, len(expected))
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index') + '?cursor=')
+        self.assertEqual(list(response.context['page_obj']), expected)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2,
+                       TIMELINE_PUSH_BACK_THRESHOLD=1)
+    def test_author_back_to_push_keeps_pulled_posts(self):
+        """Посты, написанные без раскладки, остаются в ленте после возврата"""
+        readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(2)
+        ]
+        for user in (self.user_follower, *readers):
+            Follow.objects.create(user=user, author=self.user_following)
+        self.assertTrue(UserStats.objects.get(
+            user=self.user_following).pulled)
+        pulled_post = Post.objects.create(
+            author=self.user_following, text='без раскладки')
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=pulled_post).exists())
+
+        # отписка не дописывает ленты сама: автор ждёт push_back_authors,
+        # а его новые посты уже раскладываются
+        Follow.objects.filter(user__in=readers).delete()
+        self.assertTrue(UserStats.objects.get(
+            user=self.user_following).pulled)
+        pending_post = Post.objects.create(
+            author=self.user_following, text='разложен')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_follower, post=pending_post).exists())
+        expected = [pending_post, pulled_post, self.post]
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), expected)
+
+        out = StringIO()
+        call_command('push_back_authors', stdout=out)
+        self.assertIn('авторов: 1', out.getvalue())
+        self.assertFalse(UserStats.objects.get(
+            user=self.user_following).pulled)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_follower, post=pulled_post).exists())
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), expected)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, len(expected))
+
+    def test_fanout_report(self):
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        Post.objects.create(author=self.user_following, text='ещё пост')
+        out = StringIO()
+        call_command('fanout_report', threshold=0, stdout=out)
+        row = out.getvalue().splitlines()[1].split()
+        # режим — текущий, а не вычисленный по --threshold
+        self.assertEqual(row, [self.user_following.username, '1', '2', '2',
+                               'push'])
+        self.assertIn('при пороге 0: 0', out.getvalue())
+        UserStats.objects.filter(user=self.user_following).update(pulled=True)
+        out = StringIO()
+        call_command('fanout_report', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1].split()[-1], 'pull')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_comment_post(self):
+        """Счётчики меняются вместе с подписками, постами и комментариями"""
+        self.client_auth_follower.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_following.username}))
+        self.assertEqual(self.stats(self.user_following).followers_count, 1)
+        self.assertEqual(self.stats(self.user_follower).following_count, 1)
+
+        self.client_auth_follower.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'комментарий'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        self.client_auth_following.post(
+            reverse('posts:post_create'), data={'text': 'ещё пост'})
+        self.assertEqual(self.stats(self.user_following).posts_count, 2)
+        response = self.client_auth_follower.get(reverse(
+            'posts:profile',
+            kwargs={'username': self.user_following.username}))
+        self.assertContains(response, 'Подписчиков: 1')
+
+        self.client_auth_follower.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user_following.username}))
+        Comment.objects.all().delete()
+        Post.objects.filter(author=self.user_following).delete()
+        self.assertEqual(self.stats(self.user_following).followers_count, 0)
+        self.assertEqual(self.stats(self.user_follower).following_count, 0)
+        self.assertEqual(self.stats(self.user_following).posts_count, 0)
+
+    def test_reconcile_counters(self):
+        Comment.objects.create(
+            post=self.post, author=self.user_follower, text='комментарий')
+        UserStats.objects.filter(user=self.user_following).update(
+            posts_count=7, followers_count=3)
+        UserStats.objects.filter(user=self.user_follower).delete()
+        Post.objects.filter(pk=self.post.pk).update(comments_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('пользователей: 2, постов: 1', out.getvalue())
+        stats = self.stats(self.user_following)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 0))
+        self.assertTrue(
+            UserStats.objects.filter(user=self.user_follower).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+class ConditionalGetTest(TestCase):
+    """Ленты и страница поста отвечают 304 без рендера шаблона."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='conditional', description='-')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Первый пост')
+        self.client.force_login(self.reader)
+
+    def revalidate(self, address):
+        first = self.client.get(address)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        return self.client.get(address, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_not_modified_pages(self):
+        addresses = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.revalidate(address)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_index_revalidation_skips_database(self):
+        guest = Client()
+        etag = guest.get(reverse('posts:index'))['ETag']
+        with self.assertNumQueries(0):
+            response = guest.get(
+                reverse('posts:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        last_modified = guest.get(reverse('posts:index'))['Last-Modified']
+        response = guest.get(
+            reverse('posts:index'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_validators_change_with_content(self):
+        index = reverse('posts:index')
+        detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id})
+        profile = reverse('posts:profile', kwargs={'username': 'writer'})
+        etags = {
+            address: self.client.get(address)['ETag']
+            for address in (index, detail, profile)
+        }
+        Post.objects.create(author=self.author, text='Второй пост')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for address, etag in etags.items():
+            with self.subTest(address=address):
+                response = self.client.get(
+                    address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        address = reverse('posts:index')
+        etag = self.client.get(address)['ETag']
+        self.assertNotEqual(Client().get(address)['ETag'], etag)
+
+
+class NewPostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        cls.old = Post.objects.create(
+            author=cls.author, text='Старый пост', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.addresses = (
+            reverse('posts:index_new'),
+            reverse('posts:group_new', args=['group']),
+            reverse('posts:profile_new', args=['writer']),
+            reverse('posts:follow_new'),
+        )
+
+    def test_nothing_new(self):
+        for address in self.addresses:
+            with self.subTest(address=address):
+                response = self.client.get(
+                    address, {'since': self.old.id, 'format': 'count'})
+                self.assertEqual(
+                    response.json(),
+                    {'count': 0, 'more': False, 'newest': None},
+                )
+                response = self.client.get(address, {'since': self.old.id})
+                self.assertEqual(response.status_code, 204)
+
+    def test_new_posts_since_id_and_time(self):
+        moment = self.old.pub_date.isoformat()
+        new = Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group)
+        for address in self.addresses:
+            for since in (self.old.id, moment):
+                with self.subTest(address=address, since=since):
+                    response = self.client.get(
+                        address, {'since': since, 'format': 'count'})
+                    self.assertEqual(
+                        response.json(),
+                        {'count': 1, 'more': False, 'newest': new.id},
+                    )
+                    response = self.client.get(address, {'since': since})
+                    self.assertContains(response, 'Новый пост')
+                    self.assertNotContains(response, 'Старый пост')
+
+    def test_single_query(self):
+        Post.objects.create(author=self.author, text='Новый пост')
+        with self.assertNumQueries(1):
+            Client().get(
+                reverse('posts:index_new'),
+                {'since': self.old.id, 'format': 'count'},
+            )
+
+    @override_settings(POSTS_NEW_LIMIT=2)
+    def test_count_is_capped(self):
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        response = self.client.get(
+            reverse('posts:index_new'),
+            {'since': self.old.id, 'format': 'count'},
+        )
+        self.assertEqual(response.json()['count'], 2)
+        self.assertTrue(response.json()['more'])
+
+    def test_invalid_since(self):
+        for since in ('', 'вчера', '2024-13-45T00:00:00',
+                      '99999999999999999999999'):
+            with self.subTest(since=since):
+                response = self.client.get(
+                    reverse('posts:index_new'), {'since': since})
+                self.assertEqual(response.status_code, 400)
+
+    def test_unknown_group_or_author(self):
+        for address in (reverse('posts:group_new', args=['nope']),
+                        reverse('posts:profile_new', args=['nobody'])):
+            with self.subTest(address=address):
+                response = self.client.get(address, {'since': self.old.id})
+                self.assertEqual(response.status_code, 404)
+
+    def test_feed_pages_poll(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, reverse('posts:index_new'))
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertNotContains(response, reverse('posts:index_new'))
+
+
+class FollowConcurrencyTest(TransactionTestCase):
+    """Подписки из многих потоков: без ошибок и с верными счётчиками."""
+    threads = 8
+    rounds = 20
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='star')
+        Post.objects.create(author=self.author, text='Пост звезды')
+        self.readers = [
+            User.objects.create_user(username=f'fan{number}')
+            for number in range(self.threads)
+        ]
+
+    def hammer(self, reader, operations, errors, barrier):
+        addresses = {
+            name: reverse(f'posts:profile_{name}', args=['star'])
+            for name in ('follow', 'unfollow')
+        }
+        try:
+            client = Client()
+            client.force_login(reader)
+            barrier.wait(timeout=30)
+            for number in range(self.rounds):
+                for name in operations:
+                    self.assertEqual(
+                        client.get(addresses[name]).status_code, 302)
+            client.get(addresses['follow'])
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def run_threads(self, jobs):
+        errors = []
+        barrier = threading.Barrier(len(jobs))
+        workers = [
+            threading.Thread(
+                target=self.hammer, args=(*job, errors, barrier))
+            for job in jobs
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return errors
+
+    def test_follow_unfollow_from_many_threads(self):
+        # двойные клики: каждая операция повторяется дважды
+        errors = self.run_threads([
+            (reader, ('follow', 'follow', 'unfollow', 'unfollow'))
+            for reader in self.readers
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            Follow.objects.filter(author=self.author).count(), self.threads)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count,
+            self.threads,
+        )
+        for reader in self.readers:
+            self.assertEqual(
+                UserStats.objects.get(user=reader).following_count, 1)
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=reader).count(), 1)
+
+    def test_same_pair_from_many_threads(self):
+        """Подписка и отписка одной пары из разных вкладок одновременно"""
+        reader = self.readers[0]
+        errors = self.run_threads([
+            (reader, ('follow', 'unfollow') if number % 2 else
+             ('unfollow', 'follow'))
+            for number in range(self.threads)
+        ])
+        self.assertEqual(errors, [])
+        follows = Follow.objects.filter(user=reader, author=self.author)
+        # последней у каждого потока идёт подписка: строка ровно одна
+        self.assertEqual(follows.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count,
+            follows.count(),
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=reader).following_count,
+            follows.count(),
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(),
+            follows.count(),
+        )
@@ -0,0 +1,197 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .cache import bump_generation, invalidate_posts
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def thumbnail_sizes():
+    """Варианты превью: {'480.webp': (геометрия, параметры sorl)}."""
+    Image.init()
+    card_width, card_height = settings.THUMBNAIL_CARD_SIZE
+    return {
+        f'{width}.{format_.lower()}': (
+            f'{width}x{round(width * card_height / card_width)}',
+            {'crop': 'center', 'upscale': True, 'format': format_},
+        )
+        for format_ in settings.THUMBNAIL_FORMATS if format_ in Image.SAVE
+        for width in settings.THUMBNAIL_WIDTHS
+    }
+
+
+def default_size():
+    """Превью для src: ширина карточки в запасном формате."""
+    return (f'{settings.THUMBNAIL_CARD_SIZE[0]}.'
+            f'{settings.THUMBNAIL_FORMATS[-1].lower()}')
+
+
+def thumbnail_options(source, options):
+    """Параметры превью так же, как их дополняет ThumbnailBackend."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def source_file(image):
+    """Оригинал в хранилище Post.image: от него зависят ключи kvstore."""
+    return ImageFile(
+        getattr(image, 'name', image),
+        Post._meta.get_field('image').storage,
+    )
+
+
+def thumbnail_file(image, size):
+    """Файл превью размера size; сама картинка не строится."""
+    geometry, options = thumbnail_sizes()[size]
+    source = source_file(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+    return ImageFile(name, default.storage)
+
+
+def _kvstore_values(keys):
+    """Значения kvstore по ключам: один get_many и один запрос к базе."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        # отсутствие тоже кэшируется, как это делает сам kvstore
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return values
+
+
+def ready_thumbnails(images, sizes=None):
+    """Готовые превью картинок страницы одним запросом.
+
+    Возвращает {имя картинки: {размер: превью или None}}.
+    """
+    sizes = list(thumbnail_sizes() if sizes is None else sizes)
+    keys = {
+        add_prefix(thumbnail_file(image, size).key): (
+            getattr(image, 'name', image), size)
+        for image in images if image
+        for size in sizes
+    }
+    ready = {}
+    for key, value in _kvstore_values(list(keys)).items():
+        name, size = keys[key]
+        ready.setdefault(name, {})[size] = (
+            deserialize_image_file(value)
+            if value and value != EMPTY_VALUE else None
+        )
+    return ready
+
+
+def ready_thumbnail(image, size):
+    """Готовое превью или None; картинка при этом не строится."""
+    if not image:
+        return None
+    name = getattr(image, 'name', image)
+    return ready_thumbnails([image], [size])[name][size]
+
+
+def picture(thumbnails):
+    """Данные для <picture> из готовых превью одной картинки.
+
+    None, пока не построено превью по умолчанию: шаблон тогда
+    показывает оригинал.
+    """
+    src = thumbnails.get(default_size())
+    if src is None:
+        return None
+    srcsets = {}
+    for size, (_, options) in thumbnail_sizes().items():
+        thumbnail = thumbnails.get(size)
+        if thumbnail is not None:
+            srcsets.setdefault(options['format'], []).append(
+                f'{thumbnail.url} {thumbnail.width}w')
+    fallback = settings.THUMBNAIL_FORMATS[-1]
+    return {
+        'src': src.url,
+        'width': src.width,
+        'height': src.height,
+        'srcset': ', '.join(srcsets.pop(fallback, [])),
+        'sources': [
+            {'type': f'image/{format_.lower()}', 'srcset': ', '.join(urls)}
+            for format_, urls in srcsets.items()
+        ],
+    }
+
+
+def render_thumbnails(name):
+    """Строит все варианты превью и обновляет кэш лент."""
+    try:
+        for geometry, options in thumbnail_sizes().values():
+            get_thumbnail(source_file(name), geometry, **options)
+        posts = Post.objects.filter(image=name)
+        # карточки и фрагменты лент с оригиналом вместо превью устарели
+        posts.update(updated=timezone.now())
+        rows = list(posts.values_list('id', 'author_id', 'group_id'))
+        invalidate_posts(*(post_id for post_id, _, _ in rows))
+        bump_generation(
+            'index',
+            *{f'author:{author_id}' for _, author_id, _ in rows},
+            *{f'group:{group_id}' for _, _, group_id in rows if group_id},
+        )
+    except Exception:
+        logger.exception('Не удалось построить превью %s', name)
+
+
+def _render_in_pool(name):
+    try:
+        render_thumbnails(name)
+    finally:
+        # поток пула живёт долго: соединение не должно оставаться открытым
+        connections.close_all()
+
+
+def schedule_thumbnails(name):
+    """Ставит построение превью в очередь после коммита транзакции."""
+    if settings.THUMBNAIL_WORKERS:
+        job = partial(executor().submit, _render_in_pool, name)
+    else:
+        job = partial(render_thumbnails, name)
+    transaction.on_commit(job)
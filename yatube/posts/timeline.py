@@ -0,0 +1,248 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import (KEYSET_ORDERING, cached_count, feed_count_key,
+                    invalidate_feed_counts, keyset_slice, newer_keys)
+
+ENTRY_ORDERING = ('-pub_date', '-post_id')
+PULLED_AUTHORS_KEY = 'posts:timeline:pulled'
+
+
+def pulled_authors():
+    """Авторы, чьи посты не раскладываются, а подмешиваются при чтении."""
+    authors = cache.get(PULLED_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            UserStats.objects.filter(
+                pulled=True).values_list('user_id', flat=True)
+        )
+        cache.set(PULLED_AUTHORS_KEY, authors,
+                  settings.TIMELINE_PULLED_AUTHORS_TIMEOUT)
+    return authors
+
+
+def is_pulled(author_id):
+    return author_id in pulled_authors()
+
+
+def _entries(user_ids, author_id):
+    posts = list(
+        Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date').values_list('id', 'pub_date')[
+                :settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    for user_id in user_ids:
+        for post_id, pub_date in posts:
+            yield TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+
+
+def push_back_threshold():
+    return min(settings.TIMELINE_PUSH_BACK_THRESHOLD,
+               settings.TIMELINE_FANOUT_THRESHOLD)
+
+
+def fans_out(author_id):
+    """Раскладываются ли новые посты автора по лентам подписчиков.
+
+    Автор, ждущий возврата к раскладке (см. push_back), всё ещё читается
+    по индексу автора, но новые посты уже раскладываются: push_back
+    остаётся дописать только посты, написанные до него.
+    """
+    if not is_pulled(author_id):
+        return True
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__lte=push_back_threshold()
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not fans_out(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.id,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if is_pulled(author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], author_id),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _mode_changed(author_id):
+    cache.delete(PULLED_AUTHORS_KEY)
+    # счётчики лент подписчиков теперь складываются из других источников
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    invalidate_feed_counts(
+        *(feed_count_key('follow', user_id) for user_id in followers))
+
+
+def update_mode(author_id):
+    """Переводит автора на подмешивание при чтении, если он перерос порог.
+
+    Вызывается после изменения числа подписчиков; условный UPDATE
+    переключает режим ровно один раз, даже если подписки меняются
+    параллельно. Обратно к раскладке авторов возвращает push_back.
+    """
+    if UserStats.objects.filter(
+        user_id=author_id,
+        pulled=False,
+        followers_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).update(pulled=True):
+        _mode_changed(author_id)
+
+
+def authors_to_push_back():
+    return UserStats.objects.filter(
+        pulled=True, followers_count__lte=push_back_threshold()
+    ).values_list('user_id', flat=True)
+
+
+def push_back(author_id):
+    """Возвращает автора к раскладке (manage.py push_back_authors).
+
+    Пока автор подмешивался, его посты в ленты не попадали: последние
+    TIMELINE_BACKFILL_LIMIT из них дописываются во все ленты подписчиков
+    пачками вне запроса, и только потом ленты начинают читать записи.
+    Возвращает False, если автор успел снова перерасти порог.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(followers.iterator(), author_id),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    pushed = UserStats.objects.filter(
+        user_id=author_id,
+        pulled=True,
+        followers_count__lte=push_back_threshold(),
+    ).update(pulled=False)
+    if pushed:
+        _mode_changed(author_id)
+    return bool(pushed)
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def post_key(post):
+    return post.pub_date, post.id
+
+
+class FollowFeed:
+    """Лента подписок для Paginator и KeysetPaginator.
+
+    Посты обычных авторов читаются из разложенной ленты, посты авторов
+    из pulled_authors() — напрямую по индексу автора; источники
+    склеиваются слиянием по (pub_date, id).
+    """
+    model = Post
+
+    def __init__(self, user):
+        self.user = user
+        pulled = pulled_authors()
+        self.pulled = list(
+            Follow.objects.filter(
+                user=user, author_id__in=pulled
+            ).values_list('author_id', flat=True)
+        ) if pulled else []
+        self.entries = TimelineEntry.objects.filter(
+            user=user
+        ).exclude(
+            author_id__in=self.pulled
+        ).select_related('post__author', 'post__group')
+
+    def _sources(self, key, forward, limit):
+        entries = keyset_slice(
+            self.entries, ENTRY_ORDERING, key, forward, limit)
+        yield (entry.post for entry in entries)
+        for author_id in self.pulled:
+            posts = Post.objects.filter(
+                author_id=author_id).select_related('author', 'group')
+            yield keyset_slice(posts, KEYSET_ORDERING, key, forward, limit)
+
+    def seek(self, key, forward, limit):
+        merged = heapq.merge(
+            *self._sources(key, forward, limit),
+            key=post_key,
+            reverse=forward,
+        )
+        return islice(merged, limit)
+
+    def seek_keys(self, key, forward, limit):
+        """То же, что seek, но только пары (pub_date, id) без постов."""
+        sources = [keyset_slice(
+            self.entries.values_list('pub_date', 'post_id'),
+            ENTRY_ORDERING, key, forward, limit)]
+        sources += [
+            keyset_slice(
+                Post.objects.filter(
+                    author_id=author_id).values_list('pub_date', 'id'),
+                KEYSET_ORDERING, key, forward, limit)
+            for author_id in self.pulled
+        ]
+        return islice(heapq.merge(*sources, reverse=forward), limit)
+
+    def newer(self, since, limit):
+        """(pub_date, id) постов ленты новее since (см. parse_since)."""
+        entry_since = {
+            f'post_{lookup}' if lookup.startswith('id') else lookup: value
+            for lookup, value in since.items()
+        }
+        sources = [
+            self.entries.filter(**entry_since).order_by(
+                *ENTRY_ORDERING).values_list('pub_date', 'post_id')[:limit]
+        ]
+        sources += [
+            newer_keys(Post.objects.filter(author_id=author_id), since, limit)
+            for author_id in self.pulled
+        ]
+        return list(islice(heapq.merge(*sources, reverse=True), limit))
+
+    def count(self):
+        total = cached_count(
+            feed_count_key('follow', self.user.id), self.entries.count)
+        for author_id in self.pulled:
+            total += cached_count(
+                feed_count_key('author', author_id),
+                Post.objects.filter(author_id=author_id).count,
+            )
+        return total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('FollowFeed supports plain slices only')
+        start = index.start or 0
+        return list(self.seek(None, True, index.stop))[start:]
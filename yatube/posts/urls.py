@@ -1,19 +1,28 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('new/', views.index_new, name='index_new'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('group/<slug:slug>/new/', views.group_new, name='group_new'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/new/', views.profile_new,
+         name='profile_new'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('search/', views.search, name='search'),
+    path('suggest/', views.suggest, name='suggest'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/new/', views.follow_new, name='follow_new'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -24,4 +33,14 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.posts, name='api_posts'),
+    path('api/posts/<int:post_id>/comments/', api.post_comments,
+         name='api_post_comments'),
+    path('api/group/<slug:slug>/posts/', api.group_posts,
+         name='api_group_posts'),
+    path('api/profile/<str:username>/posts/', api.profile_posts,
+         name='api_profile_posts'),
+    path('api/follow/posts/', api.follow_posts, name='api_follow_posts'),
+    path('api/groups/', api.groups, name='api_groups'),
+    path('api/follows/', api.follows, name='api_follows'),
 ]
@@ -1,8 +1,296 @@
+import binascii
+import json
+from collections.abc import Sequence
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# порядок ленты: id разрешает совпадения pub_date
+KEYSET_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class LazyList(Sequence):
+    """Список, который вычисляется при первом обращении."""
+
+    def __init__(self, load):
+        self._load = load
+
+    @cached_property
+    def _items(self):
+        return self._load()
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+def keyset_filter(ordering, key, forward):
+    """Условие «строго после key» в порядке ordering (или до, если назад)."""
+    fields = [name.lstrip('-') for name in ordering]
+    condition = Q()
+    for position, order in enumerate(ordering):
+        descending = order.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        step = Q(**{f'{fields[position]}__{lookup}': key[position]})
+        for previous, value in zip(fields[:position], key):
+            step &= Q(**{previous: value})
+        condition |= step
+    # нестрогая граница по первому полю даёт планировщику диапазон индекса
+    bound = 'lte' if ordering[0].startswith('-') == forward else 'gte'
+    return Q(**{f'{fields[0]}__{bound}': key[0]}) & condition
+
+
+def reversed_ordering(ordering):
+    return [
+        order[1:] if order.startswith('-') else f'-{order}'
+        for order in ordering
+    ]
+
+
+def keyset_slice(queryset, ordering, key, forward, limit):
+    if key is not None:
+        queryset = queryset.filter(keyset_filter(ordering, key, forward))
+    if not forward:
+        ordering = reversed_ordering(ordering)
+    return queryset.order_by(*ordering)[:limit]
+
+
+class KeysetPage(Page):
+    """Страница без номера: соседние страницы доступны только по курсору."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self)}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+# диапазон INTEGER в SQLite и BIGINT в PostgreSQL
+MAX_DB_INTEGER = 2 ** 63 - 1
+
+
+def valid_key_value(value):
+    if value is None:
+        return False
+    if isinstance(value, int):
+        return -MAX_DB_INTEGER - 1 <= value <= MAX_DB_INTEGER
+    return True
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по ключу сортировки вместо LIMIT/OFFSET.
+
+    Каждая страница — один запрос `WHERE key < last_key LIMIT n + 1`
+    по индексу, без COUNT(*), поэтому глубина страницы не влияет
+    на стоимость запроса.
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page, ordering=KEYSET_ORDERING):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name in self.fields]
+        return [getattr(row, name) for name in self.fields]
+
+    def encode_cursor(self, row, forward=True):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self._key(row)
+        ]
+        raw = json.dumps([int(forward), values], separators=(',', ':'))
+        return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (forward, key); пустой курсор — первая страница."""
+        if not cursor:
+            return True, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            forward, values = json.loads(urlsafe_b64decode(padded))
+            if len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.object_list.model
+            key = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise InvalidCursor(cursor)
+        # None в ключе не сравнить в запросе, а число вне диапазона
+        # базы она не примет
+        if not all(map(valid_key_value, key)):
+            raise InvalidCursor(cursor)
+        return bool(forward), key
+
+    def _fetch(self, key, forward, limit):
+        # источники со своей склейкой (например, лента подписок)
+        # сами умеют отдать срез после ключа
+        seek = getattr(self.object_list, 'seek', None)
+        if seek is not None:
+            return list(seek(key, forward, limit))
+        return list(keyset_slice(
+            self.object_list, self.ordering, key, forward, limit))
+
+    def page(self, cursor):
+        forward, key = self.decode_cursor(cursor)
+        rows = self._fetch(key, forward, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows, self)
+        has_next = has_more if forward else True
+        has_previous = key is not None if forward else has_more
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=(self.encode_cursor(rows[-1])
+                         if has_next else None),
+            previous_cursor=(self.encode_cursor(rows[0], forward=False)
+                             if has_previous else None),
+        )
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page('')
+
+
+def parse_since(value):
+    """Условие ?since=: id поста или момент в ISO 8601; None — не разобрать."""
+    if value.isdigit():
+        if int(value) > MAX_DB_INTEGER:
+            return None
+        return {'id__gt': int(value)}
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return {'pub_date__gt': moment}
+
+
+def newer_keys(queryset, since, limit):
+    """(pub_date, id) постов новее since, от новых к старым."""
+    return list(
+        queryset.filter(**since).order_by(
+            *KEYSET_ORDERING).values_list('pub_date', 'id')[:limit]
+    )
+
+
+def comments_page(comments, cursor):
+    """Порция комментариев поста в порядке написания."""
+    return KeysetPaginator(
+        comments, settings.COMMENTS_LIMIT, COMMENT_ORDERING
+    ).get_page(cursor)
+
+
+def feed_count_key(feed, pk=None):
+    """Ключ кэша с числом постов ленты: index, group, author, follow."""
+    if pk is None:
+        return f'posts:count:{feed}'
+    return f'posts:count:{feed}:{pk}'
+
+
+def invalidate_feed_counts(*keys):
+    cache.delete_many(keys)
+
+
+def cached_count(key, count):
+    """Число из кэша; count() вызывается только при промахе."""
+    value = cache.get(key)
+    if value is None:
+        value = count()
+        cache.set(key, value, settings.POSTS_COUNT_CACHE_TIMEOUT)
+    return value
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт число объектов из кэша.
+
+    COUNT(*) выполняется только при промахе; сбрасывают счётчики
+    сигналы Post и Follow (см. posts.signals).
+    """
+
+    def __init__(self, object_list, per_page, count_key):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.count_key, self.object_list.count)
+
+
+def page_window(page_obj, on_each_side=None):
+    """Номера страниц вокруг текущей вместо всего page_range."""
+    if on_each_side is None:
+        on_each_side = settings.POSTS_PAGE_WINDOW
+    first = max(page_obj.number - on_each_side, 1)
+    last = min(page_obj.number + on_each_side,
+               page_obj.paginator.num_pages)
+    return range(first, last + 1)
+
 
+def pagination_fun(some_list, request, count_key=None, hydrate=None):
+    """Страница ленты.
 
-def pagination_fun(some_list, request):
-    page_number = request.GET.get('page')
-    page_obj = Paginator(some_list, settings.POSTS_LIMIT).get_page(page_number)
+    count_key — ключ кэша с числом объектов (см. feed_count_key),
+    hydrate — функция, которая по списку id отдаёт объекты страницы;
+    тогда из some_list читаются только ключевые колонки.
+    """
+    if hydrate is not None:
+        some_list = some_list.select_related(None).only('id', 'pub_date')
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        page_obj = KeysetPaginator(
+            some_list, settings.POSTS_LIMIT).get_page(cursor)
+    else:
+        page_number = request.GET.get('page')
+        if count_key is None:
+            paginator = Paginator(some_list, settings.POSTS_LIMIT)
+        else:
+            paginator = CachedCountPaginator(
+                some_list, settings.POSTS_LIMIT, count_key)
+        page_obj = paginator.get_page(page_number)
+        page_obj.page_window = page_window(page_obj)
+    if hydrate is not None:
+        # строки читаются только если фрагмент ленты не нашёлся в кэше
+        rows = page_obj.object_list
+        if cursor is not None:
+            # курсорная страница уже прочитана: её состав — ключ фрагмента
+            page_obj.row_ids = [row.pk for row in rows]
+        page_obj.object_list = LazyList(
+            lambda: hydrate([row.pk for row in rows]))
     return page_obj
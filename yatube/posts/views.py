@@ -1,41 +1,64 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from . import follows
+from .cache import feed_cache_context, hydrate_posts
+from .conditional import (conditional, group_validators, index_validators,
+                          post_validators, profile_validators)
 from .forms import PostForm, CommentForm
 from .models import Follow, Group, Post, User
-from .utils import pagination_fun
+from .search import SearchResults
+from .suggest import prefix_index
+from .timeline import FollowFeed
+from .utils import (comments_page, feed_count_key, newer_keys, page_window,
+                    pagination_fun, parse_since)
 
 
-@cache_page(20)
+@conditional(index_validators)
 def index(request):
     post_list = Post.objects.select_related('group', 'author')
 
-    page_obj = pagination_fun(post_list, request)
+    page_obj = pagination_fun(
+        post_list, request, feed_count_key('index'), hydrate_posts)
     context = {
         'page_obj': page_obj,
+        **feed_cache_context('index', page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_validators)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('group', 'author')
 
-    page_obj = pagination_fun(post_list, request)
+    page_obj = pagination_fun(
+        post_list, request, feed_count_key('group', group.id),
+        hydrate_posts)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(f'group:{group.id}', page_obj),
     }
 
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_validators)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     post_list = author.posts.select_related('group', 'author')
 
-    page_obj = pagination_fun(post_list, request)
+    page_obj = pagination_fun(
+        post_list, request, feed_count_key('author', author.id),
+        hydrate_posts)
     following = Follow.objects.filter(
         user=request.user, author=author).exists() \
         if request.user.is_authenticated else False
@@ -44,14 +67,19 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        **feed_cache_context(f'author:{author.id}', page_obj),
     }
 
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_validators)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        id=post_id,
+    )
+    comments = comments_page(post.comments.select_related('author'), '')
     form = CommentForm()
     return render(request,
                   'posts/post_detail.html',
@@ -62,6 +90,107 @@ def post_detail(request, post_id):
                   })
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = comments_page(
+        post.comments.select_related('author'),
+        request.GET.get('cursor'),
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    return render(
+        request,
+        'posts/includes/comments.html',
+        {'comments': comments, 'post_id': post_id},
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), settings.POSTS_LIMIT)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.page_window = page_window(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def suggest(request):
+    results = prefix_index.search(
+        request.GET.get('q', ''), settings.SUGGEST_LIMIT)
+    return JsonResponse({'results': results})
+
+
+def new_posts(request, newer):
+    """Посты ленты новее ?since=: число (format=count) или карточки.
+
+    newer(since, limit) отдаёт пары (pub_date, id) одним запросом
+    по индексу ленты, без COUNT(*) и пагинации.
+    """
+    since = parse_since(request.GET.get('since', ''))
+    if since is None:
+        return JsonResponse(
+            {'error': 'since — id поста или время в ISO 8601'}, status=400)
+    limit = settings.POSTS_NEW_LIMIT
+    keys = newer(since, limit + 1)
+    more = len(keys) > limit
+    keys = keys[:limit]
+    newest = keys[0][1] if keys else None
+    if request.GET.get('format') == 'count':
+        return JsonResponse(
+            {'count': len(keys), 'more': more, 'newest': newest})
+    if not keys:
+        return HttpResponse(status=204)
+    posts = hydrate_posts([pk for _, pk in keys[:settings.POSTS_LIMIT]])
+    return render(
+        request,
+        'posts/includes/new_posts.html',
+        {'posts': posts, 'newest': newest},
+    )
+
+
+def index_new(request):
+    return new_posts(
+        request,
+        lambda since, limit: newer_keys(Post.objects.all(), since, limit),
+    )
+
+
+def group_new(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return new_posts(
+        request,
+        lambda since, limit: newer_keys(group.posts.all(), since, limit),
+    )
+
+
+def profile_new(request, username):
+    author = get_object_or_404(User, username=username)
+    return new_posts(
+        request,
+        lambda since, limit: newer_keys(author.posts.all(), since, limit),
+    )
+
+
+@login_required
+def follow_new(request):
+    return new_posts(request, FollowFeed(request.user).newer)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -69,7 +198,8 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -102,14 +232,14 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    page = pagination_fun(posts_list, request)
+    page = pagination_fun(FollowFeed(request.user), request)
 
     return render(
         request,
@@ -120,15 +250,11 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
-    user = request.user
-    if author != user:
-        Follow.objects.get_or_create(user=user, author=author)
+    follows.follow(request.user.id, username)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    user = request.user
-    Follow.objects.get(user=user, author__username=username).delete()
+    follows.unfollow(request.user.id, username)
     return redirect('posts:profile', username=username)
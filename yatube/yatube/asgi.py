@@ -0,0 +1,38 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 умеет только WSGI, поэтому сайт работает через WsgiToAsgi
+в пуле потоков, а поток событий /stream/ (posts.stream) обслуживается
+корутинами: тысячи простаивающих соединений не занимают потоков.
+
+Запуск, например: uvicorn yatube.asgi:application
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+django_application = WsgiToAsgi(get_wsgi_application())
+
+from posts import stream  # noqa: E402  модели доступны только после setup
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'].startswith(stream.PREFIX):
+        return await stream.stream(scope, receive, send)
+    return await django_application(scope, receive, send)
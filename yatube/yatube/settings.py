@@ -87,6 +87,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # тестовая база в файле: в общей базе в памяти SQLite параллельные
+        # пишущие потоки получают «table is locked» вместо ожидания
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
@@ -125,6 +128,13 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# YATUBE_SERVE_FILES=1 — боевая раздача файлов самим Django (core.views.serve):
+# статика с хэшами в именах и сжатыми копиями после collectstatic,
+# медиа с ETag и Range; иначе при DEBUG работает django.views.static
+SERVE_FILES = os.getenv('YATUBE_SERVE_FILES') == '1'
+if SERVE_FILES:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -136,13 +146,104 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_LIMIT = 10
+COMMENTS_LIMIT = 20
+# сколько новых постов считает ответ на ?since= (дальше — «больше N»)
+POSTS_NEW_LIMIT = 100
+# сколько номеров страниц показывать по обе стороны от текущей
+POSTS_PAGE_WINDOW = 3
+# счётчики постов лент сбрасываются сигналами, таймаут — страховка
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 60 * 24
+# фрагменты лент сбрасываются сменой поколения (posts.cache)
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# карточка поста в ключе содержит Post.updated, старые просто вытесняются
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# объекты постов для hydrate_posts, сбрасываются сигналами
+POST_CACHE_TIMEOUT = 60 * 60 * 24
+# сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 1000
+TIMELINE_BATCH_SIZE = 500
+# посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении (см. manage.py fanout_report)
+TIMELINE_FANOUT_THRESHOLD = 10000
+# обратно к раскладке автор возвращается, только потеряв заметную долю
+# подписчиков: иначе каждое колебание у порога стоило бы полной дозаписи
+# его постов во все ленты. Дозапись делает manage.py push_back_authors
+# (по расписанию), а не запрос отписки
+TIMELINE_PUSH_BACK_THRESHOLD = 9000
+TIMELINE_PULLED_AUTHORS_TIMEOUT = 60 * 10
+# поиск по постам: индекс из основ слов ведёт бэкенд (для SQLite — FTS5),
+# другой базе нужен свой подкласс posts.search.SearchBackend;
+# глубже POSTS_SEARCH_MAX_RESULTS результаты не листаются
+POSTS_SEARCH_BACKEND = 'posts.search.SqliteFTSBackend'
+POSTS_SEARCH_MAX_RESULTS = 1000
+# подсказки групп и авторов по префиксу (posts.suggest)
+SUGGEST_LIMIT = 10
+# журнал изменений индекса подсказок в кэше: сколько он хранится и на
+# сколько изменений процесс может отстать, прежде чем перестроит индекс
+SUGGEST_CHANGES_TIMEOUT = 60 * 60
+SUGGEST_CHANGES_LIMIT = 1000
+# поток событий /stream/ (yatube/asgi.py, posts.stream): очередь клиента,
+# после которой события теряются, пинг простаивающего соединения
+# в секундах и пауза переподключения браузера в миллисекундах
+STREAM_QUEUE_SIZE = 100
+STREAM_KEEPALIVE = 15
+STREAM_RETRY = 3000
+# JSON API (posts.api): размер страницы задаётся ?limit= не больше этого
+API_MAX_LIMIT = 100
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# загрузки всегда пишутся во временный файл, а не держатся в памяти
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# картинка поста при загрузке уменьшается по длинной стороне,
+# теряет EXIF и перекодируется один раз
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_DIMENSION = 2048
+POST_IMAGE_JPEG_QUALITY = 85
+# превью картинок постов строятся после сохранения поста в фоновых потоках:
+# карточка 960x339 во всех ширинах для srcset и во всех форматах — от
+# предпочтительного к запасному; формат, который не умеет Pillow, пропускается
+THUMBNAIL_CARD_SIZE = (960, 339)
+THUMBNAIL_WIDTHS = (480, 720, 960, 1440)
+THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+# 0 — строить превью сразу после коммита, в том же потоке
+THUMBNAIL_WORKERS = int(os.getenv('YATUBE_THUMBNAIL_WORKERS', 2))
+# Кэш выбирается переменными окружения. locmem живёт внутри процесса,
+# поэтому с несколькими воркерами gunicorn нужен общий бэкенд:
+# file (общий каталог с атомарным incr, годится и как локальная замена
+# сервера),
+# memcached (python-memcached), pylibmc или redis (django-redis).
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': (
+        'core.cache.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'memcached': (
+        'django.core.cache.backends.memcached.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+    'pylibmc': (
+        'django.core.cache.backends.memcached.PyLibMCCache',
+        '127.0.0.1:11211',
+    ),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND = os.getenv('YATUBE_CACHE_BACKEND', 'locmem')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': os.getenv('YATUBE_CACHE_PREFIX', 'yatube'),
     }
 }
+if CACHE_BACKEND in ('locmem', 'file'):
+    # по умолчанию Django держит 300 ключей — меньше, чем карточек в лентах
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('YATUBE_CACHE_MAX_ENTRIES', 20000)),
+    }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
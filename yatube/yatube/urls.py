@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.views import serve
 
 handler403 = 'core.views.permission_denied'
 handler404 = 'core.views.page_not_found'
@@ -14,7 +16,19 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
 ]
 
-if settings.DEBUG:
+if settings.SERVE_FILES:
+    urlpatterns += [
+        re_path(
+            rf'^{prefix.lstrip("/")}(?P<path>.*)$',
+            serve,
+            {'document_root': document_root},
+        )
+        for prefix, document_root in (
+            (settings.STATIC_URL, settings.STATIC_ROOT),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT),
+        )
+    ]
+elif settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )